@@ -20,14 +20,45 @@ NMS System Data Exporter v3.6
 Mejoras varias
 """
 
+import os
+import sys
+import gzip
 import json
+import atexit
+import shutil
+import socket
+import sqlite3
+import zlib
+import base64
+import queue
+import math
+import mmap
+import struct
+import uuid
+import hashlib
 import logging
+import time
+import pstats
+import cProfile
+import argparse
+import threading
+import functools
+import itertools
 import ctypes
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Dict, Any, List
-from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Tuple, FrozenSet, Iterator, Iterable, NamedTuple, get_origin
+from dataclasses import dataclass, field, fields
+from abc import ABC, abstractmethod
 from enum import IntEnum
+from functools import lru_cache
+from collections import Counter, deque
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
 
 from pymhf import Mod
 from pymhf.core.hooking import on_key_release
@@ -82,11 +113,2180 @@ RESOURCE_NAMES = {
     'PLANT_POOP': 'Hecesio',
 }
 
+CONFIG_FILE = "exporter_config.json"
+
+
+def read_config(root: Path) -> Dict[str, Any]:
+    """Contenido de root/exporter_config.json, o {} si no existe o no se puede leer"""
+    path = root / CONFIG_FILE
+    if not path.exists():
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        if not isinstance(config, dict):
+            raise ValueError("no es un objeto JSON")
+        return config
+    except Exception as e:
+        logger.error(f"Error leyendo {CONFIG_FILE}: {e}")
+        return {}
+
+
+# Campos simples de mSolarSystemData
+SAFE_SYSTEM_FIELDS = {
+    'AnomalyStation': 'estacion_anomalia',
+    'PirateStation': 'estacion_pirata',
+    'Abandoned': 'abandonado',
+    'Planets': 'num_planetas_campo',
+    'PrimePlanets': 'planetas_primarios',
+}
+
+SYSTEM_FIELDS = (
+    'Name', 'InhabitingRace', 'Class', 'StarType', 'Seed', 'SpaceStationSpawn',
+    *SAFE_SYSTEM_FIELDS, 'TradingData', 'ConflictData', 'AsteroidLevel',
+)
+
+# Campos de mPlanetGenerationInputData
+GEN_FIELDS = {
+    'Biome': 'bioma',
+    'BiomeSubType': 'bioma_subtipo',
+    'Class': 'clase',
+    'CommonSubstance': 'sustancia_comun',
+    'RareSubstance': 'sustancia_rara',
+    'ForceContinents': 'forzar_continentes',
+    'HasRings': 'tiene_anillos',
+    'InAbandonedSystem': 'sistema_abandonado',
+    'InEmptySystem': 'sistema_vacio',
+    'InGasGiantSystem': 'sistema_gigante_gaseoso',
+    'InPirateSystem': 'sistema_pirata',
+    'PlanetIndex': 'indice_planeta',
+    'PlanetSize': 'tamaño_planeta',
+    'Prime': 'planeta_primario',
+    'RealityIndex': 'indice_realidad',
+    'Star': 'estrella',
+}
+
+# 'Substances' agrupa Common/Uncommon/RareSubstanceID de mPlanetData
+PLANET_FIELDS = (
+    'mPosition', 'Name', 'Life', 'CreatureLife', 'Substances',
+    'ExtraResourceHints', 'mUniverseAddress',
+)
+
+# Perfiles de extraccion. None = todos los campos de la seccion.
+EXTRACTION_PROFILES: Dict[str, Dict[str, Any]] = {
+    # TradingData es una sola estructura y alimenta las vistas de economia
+    'minimal': {
+        'sistema': ('Name', 'Seed', 'Class', 'StarType', 'TradingData'),
+        'planeta': ('Name', 'Substances', 'mUniverseAddress'),
+        'generacion': ('Biome', 'RealityIndex'),
+    },
+    'resources': {
+        'sistema': ('Name', 'Seed', 'Class', 'StarType', 'InhabitingRace', 'TradingData'),
+        'planeta': ('Name', 'Substances', 'ExtraResourceHints', 'mUniverseAddress'),
+        'generacion': ('Biome', 'BiomeSubType', 'CommonSubstance', 'RareSubstance',
+                       'PlanetIndex', 'RealityIndex', 'Seed'),
+    },
+    'full': {'sistema': None, 'planeta': None, 'generacion': None},
+    # Igual que full, pero incluye los planetas descartados con su puntuacion
+    'debug': {'sistema': None, 'planeta': None, 'generacion': None, 'invalidos': True},
+}
+
+
+@dataclass(frozen=True)
+class ExtractionPlan:
+    """Perfil compilado: solo se lee de memoria lo que aparece aqui"""
+    name: str
+    system_fields: FrozenSet[str]
+    safe_fields: Tuple[Tuple[str, str], ...]
+    planet_fields: FrozenSet[str]
+    gen_fields: Tuple[Tuple[str, str], ...]
+    gen_seed: bool
+    include_invalid: bool = False
+
+
+@lru_cache(maxsize=None)
+def compile_profile(name: str) -> ExtractionPlan:
+    """Compila un perfil de EXTRACTION_PROFILES en un ExtractionPlan"""
+    if name not in EXTRACTION_PROFILES:
+        raise ValueError(f"Perfil desconocido: {name}")
+    profile = EXTRACTION_PROFILES[name]
+
+    system = frozenset(profile.get('sistema') or SYSTEM_FIELDS)
+    planet = frozenset(profile.get('planeta') or PLANET_FIELDS)
+    gen = profile.get('generacion') or (*GEN_FIELDS, 'Seed')
+
+    return ExtractionPlan(
+        name=name,
+        system_fields=system,
+        safe_fields=tuple((f, n) for f, n in SAFE_SYSTEM_FIELDS.items() if f in system),
+        planet_fields=planet,
+        gen_fields=tuple((f, n) for f, n in GEN_FIELDS.items() if f in gen),
+        gen_seed='Seed' in gen,
+        include_invalid=bool(profile.get('invalidos', False)),
+    )
+
+
+ARCHIVE_DIR = "systems"
+MANIFEST_FILE = "manifest.ndjson"
+ARCHIVE_LAYOUTS = ('galaxy', 'date')
+
+
+class SystemArchive:
+    """Archivo sharded de exports con un manifiesto id -> ruta.
+
+    Layout 'galaxy': systems/r<RealityIndex>/<prefijo seed>/<id>.json
+    Layout 'date':   systems/<YYYY>/<MM>/<DD>/<id>.json
+    """
+    
+    def __init__(self, root: Path, layout: str = 'galaxy', compact: bool = False):
+        if layout not in ARCHIVE_LAYOUTS:
+            raise ValueError(f"Layout desconocido: {layout}")
+        self.root = root
+        self.layout = layout
+        self.compact = compact
+        self.manifest_path = root / MANIFEST_FILE
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def record_time(data: Dict[str, Any]) -> datetime:
+        try:
+            return datetime.fromisoformat(data['timestamp'])
+        except Exception:
+            return datetime.now()
+    
+    @staticmethod
+    def record_reality(data: Dict[str, Any]) -> Optional[int]:
+        for planet in data.get('planetas', []):
+            reality = planet.get('generacion', {}).get('indice_realidad')
+            if isinstance(reality, int):
+                return reality
+        return None
+    
+    @classmethod
+    def new_record_id(cls, data: Dict[str, Any], salt: Optional[str] = None) -> str:
+        """ID unico: <seed hex>-<timestamp con microsegundos>-<sufijo>"""
+        seed = data.get('sistema', {}).get('seed')
+        seed_hex = f"{seed & 0xFFFFFFFFFFFFFFFF:016x}" if isinstance(seed, int) else 'x' * 16
+        ts = cls.record_time(data).strftime('%Y%m%d%H%M%S%f')
+        if salt is None:
+            suffix = uuid.uuid4().hex[:8]
+        else:
+            suffix = hashlib.sha1(salt.encode('utf-8')).hexdigest()[:8]
+        return f"{seed_hex}-{ts}-{suffix}"
+    
+    def shard_for(self, data: Dict[str, Any], record_id: str) -> Path:
+        """Ruta relativa a root del registro"""
+        if self.layout == 'date':
+            shard = Path(self.record_time(data).strftime('%Y/%m/%d'))
+        else:
+            reality = self.record_reality(data)
+            shard = Path(f"r{reality if reality is not None else 'x'}") / record_id[:2]
+        return Path(ARCHIVE_DIR) / shard / f"{record_id}.json"
+    
+    def manifest_entry(self, data: Dict[str, Any], rel: Path) -> Dict[str, Any]:
+        return {
+            'id': data['id'],
+            'ruta': rel.as_posix(),
+            'nombre': data.get('sistema', {}).get('nombre'),
+            'seed': data.get('sistema', {}).get('seed'),
+            'timestamp': data.get('timestamp'),
+            'perfil': data.get('perfil'),
+        }
+    
+    def write(self, data: Dict[str, Any], salt: Optional[str] = None) -> Path:
+        """Escribe el registro en su shard y lo anota en el manifiesto"""
+        rel = self.write_record(data, salt)
+        self.append_manifest(self.manifest_entry(data, rel))
+        return self.root / rel
+    
+    def write_record(self, data: Dict[str, Any], salt: Optional[str] = None) -> Path:
+        """Escribe solo el fichero del registro y devuelve su ruta relativa"""
+        if not data.get('id'):
+            data['id'] = self.new_record_id(data, salt)
+        rel = self.shard_for(data, data['id'])
+        path = self.root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            if self.compact:
+                json.dump(data, f, ensure_ascii=False, default=str, separators=(',', ':'))
+            else:
+                json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+        tmp.replace(path)
+        return rel
+    
+    def append_manifest(self, entry: Dict[str, Any]) -> int:
+        """Anade la entrada y devuelve el byte del manifiesto en que acaba"""
+        line = json.dumps(entry, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            with open(self.manifest_path, 'ab') as f:
+                f.write(line.encode('utf-8'))
+                return f.tell()
+    
+    def iter_manifest(self, start: int = 0, end: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Entradas del manifiesto en orden de escritura, entre los bytes start y end"""
+        for entry, _ in self.iter_manifest_lines(start, end):
+            yield entry
+    
+    def iter_manifest_lines(self, start: int = 0, end: Optional[int] = None
+                            ) -> Iterator[Tuple[Dict[str, Any], int]]:
+        """Como iter_manifest, con el byte en que acaba cada linea"""
+        if not self.manifest_path.exists():
+            return
+        with open(self.manifest_path, 'rb') as f:
+            f.seek(start)
+            pos = start
+            for lineno, raw in enumerate(f, 1):
+                pos += len(raw)
+                # Una linea sin salto final aun se esta escribiendo
+                if (end is not None and pos > end) or not raw.endswith(b'\n'):
+                    break
+                line = raw.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line.decode('utf-8')), pos
+                except ValueError:
+                    logger.warning(f"{MANIFEST_FILE}: linea {lineno} desde el byte {start} corrupta, ignorada")
+    
+    def record_paths(self, start: int = 0, end: Optional[int] = None) -> Iterator[Path]:
+        for entry in self.iter_manifest(start, end):
+            yield self.root / entry['ruta']
+    
+    def legacy_files(self) -> List[Path]:
+        """Exports planos anteriores al layout sharded"""
+        return sorted(self.root.glob("system_*.json"))
+    
+    def all_files(self) -> Iterator[Path]:
+        """Ficheros del manifiesto seguidos de los exports planos"""
+        yield from self.record_paths()
+        yield from self.legacy_files()
+    
+    def iter_records(self, paths: Optional[Iterable[Path]] = None) -> Iterator[Dict[str, Any]]:
+        """Registros de paths (por defecto, todo el archivo); los ilegibles se saltan"""
+        for f in (self.all_files() if paths is None else paths):
+            try:
+                with open(f, 'r', encoding='utf-8') as fp:
+                    yield json.load(fp)
+            except (OSError, ValueError) as e:
+                logger.debug(f"Registro ilegible {f}: {e}")
+    
+    def migrate_flat(self) -> Tuple[int, int]:
+        """Mueve los system_*.json planos al layout sharded.
+
+        El ID se deriva del nombre de fichero, asi que relanzarlo tras
+        una interrupcion no duplica registros.
+        """
+        known = {entry['id'] for entry in self.iter_manifest()}
+        moved = failed = 0
+        for f in self.legacy_files():
+            try:
+                with open(f, 'r', encoding='utf-8') as fp:
+                    data = json.load(fp)
+                if not data.get('id'):
+                    data['id'] = self.new_record_id(data, salt=f.name)
+                if data['id'] not in known:
+                    self.write(data)
+                    known.add(data['id'])
+                f.unlink()
+                moved += 1
+            except Exception as e:
+                logger.error(f"No se pudo migrar {f.name}: {e}")
+                failed += 1
+        return moved, failed
+
+
+CONSOLIDATED_FILE = "all_systems.json"
+# En el juego son hilos y json.load/dumps tienen el GIL: mas hilos solo compiten con el del juego
+INGAME_CONSOLIDATE_WORKERS = 2
+
+
+def _load_record_text(path: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """Worker: lee y valida un registro y lo devuelve ya serializado, o el error"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("no es un objeto JSON")
+        text = json.dumps(data, indent=2, ensure_ascii=False, default=str)
+        return path, text.replace('\n', '\n    '), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+
+def bounded_map(executor: Executor, fn, items: Iterable, window: int) -> Iterator:
+    """Como executor.map, en orden, pero con como mucho `window` tareas en vuelo"""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def consolidate(paths: Iterable[Path], out_path: Path, workers: Optional[int] = None,
+                processes: bool = False) -> Dict[str, Any]:
+    """Escribe out_path con todos los registros, leyendolos en paralelo.
+
+    Los registros se vuelcan al fichero segun llegan, asi que la memoria
+    no crece con el archivo. Solo escala con los nucleos con
+    processes=True (CLI). Dentro del juego hay que usar hilos, porque un
+    ProcessPoolExecutor lanzaria procesos desde NMS.exe; con hilos el
+    paralelismo solo solapa la E/S.
+    """
+    workers = workers or os.cpu_count() or 4
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    total, errors = 0, []
+    
+    tmp = out_path.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as out, pool(max_workers=workers) as executor:
+        out.write('{\n  "fecha": %s,\n  "sistemas": [' % json.dumps(datetime.now().isoformat()))
+        for path, text, error in bounded_map(executor, _load_record_text,
+                                             (str(p) for p in paths), workers * 4):
+            if error:
+                errors.append({'archivo': path, 'error': error})
+                continue
+            out.write(('\n    ' if total == 0 else ',\n    ') + text)
+            total += 1
+        out.write('\n  ],\n  "total": %d,\n  "errores": %s\n}\n'
+                  % (total, json.dumps(errors, indent=2, ensure_ascii=False).replace('\n', '\n  ')))
+    
+    if total:
+        tmp.replace(out_path)
+    else:
+        tmp.unlink()
+    return {'ruta': str(out_path) if total else None, 'total': total, 'errores': errors}
+
+
+def log_consolidation(summary: Dict[str, Any]):
+    logger.info(f"Consolidados: {summary['total']} registros")
+    if summary['errores']:
+        logger.warning(f"{len(summary['errores'])} ficheros ilegibles:")
+        for err in summary['errores'][:20]:
+            logger.warning(f"  {err['archivo']}: {err['error']}")
+        if len(summary['errores']) > 20:
+            logger.warning(f"  ... y {len(summary['errores']) - 20} mas (ver 'errores' en {CONSOLIDATED_FILE})")
+
+
+COMPACTION_DIR = ".compactacion"
+CORRUPT_DIR = "corruptos"
+LOCK_FILE = ".en_uso.lock"
+
+
+class ArchiveLock:
+    """Cerrojo de SystemData: lo tiene el mod mientras corre y lo pide la compactacion.
+
+    Es un bloqueo del sistema operativo sobre el fichero, asi que se
+    libera solo aunque el proceso muera sin cerrarlo.
+    """
+    
+    def __init__(self, root: Path):
+        self.path = root / LOCK_FILE
+        self._file = None
+    
+    def acquire(self) -> bool:
+        """Intenta tomar el cerrojo sin esperar; False si otro proceso lo tiene"""
+        f = open(self.path, 'a+b')
+        try:
+            f.seek(0)
+            if os.name == 'nt':
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+    
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            self._file.seek(0)
+            if os.name == 'nt':
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+def profile_rank(profile: Optional[str]) -> int:
+    """Riqueza de un perfil segun su orden en EXTRACTION_PROFILES.
+
+    Los exports sin perfil son anteriores a los perfiles y equivalen a 'full'.
+    """
+    names = list(EXTRACTION_PROFILES)
+    profile = profile or 'full'
+    return names.index(profile) if profile in names else -1
+
+
+def system_key(data: Dict[str, Any]) -> Optional[str]:
+    """Clave de sistema para detectar duplicados: seed + direccion del primer planeta"""
+    seed = data.get('sistema', {}).get('seed')
+    address = next((p['direccion_universo'] for p in data.get('planetas', [])
+                    if p.get('direccion_universo')), None)
+    if seed is None and address is None:
+        return None
+    return f"{seed}|{address}"
+
+
+def _scan_record(path: str) -> Dict[str, Any]:
+    """Worker de compactacion: clave, fecha y tamano de un registro"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("no es un objeto JSON")
+        return {'archivo': path, 'clave': system_key(data) or f"unico:{path}",
+                'timestamp': data.get('timestamp') or '', 'perfil': data.get('perfil'),
+                'bytes': os.path.getsize(path)}
+    except Exception as e:
+        return {'archivo': path, 'error': f"{type(e).__name__}: {e}"}
+
+
+def _compact_group(task: Tuple[str, List[str], str, str, bool]) -> Dict[str, Any]:
+    """Worker de compactacion: fusiona un grupo de duplicados.
+
+    paths llega ordenado por preferencia (perfil mas rico y, dentro de
+    el, mas reciente): se conserva el primero legible.
+    """
+    key, paths, staging, layout, keep_history = task
+    records, errors = [], []
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not data.get('id'):
+                data['id'] = SystemArchive.new_record_id(data, salt=Path(path).name)
+            records.append(data)
+        except Exception as e:
+            errors.append({'archivo': path, 'error': f"{type(e).__name__}: {e}"})
+        if records and not keep_history:
+            break
+    if not records:
+        return {'clave': key, 'errores': errors}
+    
+    newest = records[0]
+    if keep_history:
+        history, seen = [], {newest['id']}
+        for older in [newest, *records[1:]]:
+            for version in [*older.pop('historial', []), *([older] if older is not newest else [])]:
+                if version.get('id') not in seen:
+                    seen.add(version.get('id'))
+                    history.append(version)
+        history.sort(key=lambda r: r.get('timestamp') or '', reverse=True)
+        if history:
+            newest['historial'] = history
+    
+    archive = SystemArchive(Path(staging), layout, compact=True)
+    rel = archive.write_record(newest)
+    entry = archive.manifest_entry(newest, rel)
+    entry['bytes'] = (Path(staging) / rel).stat().st_size
+    dropped = [] if keep_history else paths[paths.index(path) + 1:]
+    return {'clave': key, 'entrada': entry, 'descartados': dropped, 'errores': errors}
+
+
+class ArchiveCompactor:
+    """Compacta SystemData: fusiona duplicados, reescribe el archivo y limpia.
+
+    Fases: escaneo -> escritura -> commit -> limpieza -> indices. El
+    progreso se guarda en SystemData/.compactacion/, asi que si se
+    interrumpe basta con relanzarlo. Si el mod esta en marcha (tiene el
+    ArchiveLock) no arranca.
+
+    De cada grupo de duplicados se conserva la captura del perfil mas
+    rico, y de entre ellas la mas reciente: un auto-export 'minimal'
+    posterior no sustituye a un export 'full' hecho con U.
+    """
+    PHASES = ('escaneo', 'escritura', 'commit', 'limpieza', 'indices')
+    
+    def __init__(self, root: Path, layout: str = 'galaxy', keep_history: bool = False,
+                 workers: Optional[int] = None, processes: bool = True):
+        self.root = root
+        self.work_dir = root / COMPACTION_DIR
+        self.journal_path = self.work_dir / "journal.json"
+        self.scan_log = self.work_dir / "escaneo.ndjson"
+        self.write_log = self.work_dir / "escritura.ndjson"
+        self.staging = self.work_dir / "nuevo"
+        self.old_dir = self.work_dir / "viejo"
+        self.workers = workers or os.cpu_count() or 4
+        self.processes = processes
+        self.journal = {'fase': 'escaneo', 'layout': layout, 'historial': keep_history}
+    
+    def _save_journal(self, phase: str):
+        self.journal['fase'] = phase
+        tmp = self.journal_path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.journal, f, indent=2)
+        tmp.replace(self.journal_path)
+    
+    @staticmethod
+    def _open_log(path: Path):
+        """Abre un log para anadir, recortando antes la linea a medias de una ejecucion interrumpida"""
+        if path.exists():
+            with open(path, 'rb+') as f:
+                pos = end = f.seek(0, os.SEEK_END)
+                size = end
+                while pos > 0:
+                    step = min(65536, pos)
+                    pos -= step
+                    f.seek(pos)
+                    nl = f.read(step).rfind(b'\n')
+                    if nl >= 0:
+                        end = pos + nl + 1
+                        break
+                else:
+                    end = 0
+                if end < size:
+                    f.truncate(end)
+        return open(path, 'a', encoding='utf-8')
+    
+    @staticmethod
+    def _read_log(path: Path) -> List[Dict[str, Any]]:
+        if not path.exists():
+            return []
+        entries = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # Linea a medias de una ejecucion interrumpida
+                    continue
+        return entries
+    
+    def run(self) -> Dict[str, Any]:
+        lock = ArchiveLock(self.root)
+        if not lock.acquire():
+            raise RuntimeError(f"{self.root} esta en uso: cierra el juego antes de compactar")
+        try:
+            return self._run()
+        finally:
+            lock.release()
+    
+    def _run(self) -> Dict[str, Any]:
+        self.work_dir.mkdir(exist_ok=True)
+        if self.journal_path.exists():
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                self.journal = json.load(f)
+            logger.info(f"Reanudando compactacion en fase '{self.journal['fase']}'")
+        else:
+            self._save_journal('escaneo')
+        
+        pool = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+        with pool(max_workers=self.workers) as executor:
+            start = self.PHASES.index(self.journal['fase'])
+            for phase in self.PHASES[start:]:
+                logger.info(f"Compactacion: {phase}")
+                getattr(self, f"_phase_{phase}")(executor)
+                if phase != self.PHASES[-1]:
+                    self._save_journal(self.PHASES[self.PHASES.index(phase) + 1])
+        
+        summary = self.journal.get('resumen', {})
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        return summary
+    
+    def _phase_escaneo(self, executor: Executor):
+        done = {e['archivo'] for e in self._read_log(self.scan_log)}
+        archive = SystemArchive(self.root)
+        todo = (str(p) for p in archive.all_files() if str(p) not in done)
+        with self._open_log(self.scan_log) as log:
+            for result in bounded_map(executor, _scan_record, todo, self.workers * 4):
+                log.write(json.dumps(result, ensure_ascii=False) + '\n')
+                log.flush()
+    
+    def _phase_escritura(self, executor: Executor):
+        scanned = self._read_log(self.scan_log)
+        groups: Dict[str, List[Tuple[int, str, str]]] = {}
+        for e in scanned:
+            if 'clave' in e:
+                groups.setdefault(e['clave'], []).append(
+                    (profile_rank(e.get('perfil')), e['timestamp'], e['archivo']))
+        done = {e['clave'] for e in self._read_log(self.write_log)}
+        
+        def tasks():
+            for key in sorted(groups):
+                if key in done:
+                    continue
+                paths = [path for _, _, path in sorted(groups[key], reverse=True)]
+                yield key, paths, str(self.staging), self.journal['layout'], self.journal['historial']
+        
+        with self._open_log(self.write_log) as log:
+            for result in bounded_map(executor, _compact_group, tasks(), self.workers * 4):
+                log.write(json.dumps(result, ensure_ascii=False) + '\n')
+                log.flush()
+    
+    def _phase_commit(self, executor: Executor):
+        written = self._read_log(self.write_log)
+        entries = sorted((r['entrada'] for r in written if 'entrada' in r), key=lambda e: e['ruta'])
+        
+        new_systems = self.staging / ARCHIVE_DIR
+        live_systems = self.root / ARCHIVE_DIR
+        if new_systems.exists():
+            if live_systems.exists() and not self.old_dir.exists():
+                live_systems.replace(self.old_dir)
+            if not live_systems.exists():
+                new_systems.replace(live_systems)
+        
+        tmp = self.root / (MANIFEST_FILE + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps({k: v for k, v in entry.items() if k != 'bytes'},
+                                   ensure_ascii=False, default=str) + '\n')
+        tmp.replace(self.root / MANIFEST_FILE)
+        
+        scanned = self._read_log(self.scan_log)
+        profiles = {e['archivo']: e.get('perfil') or 'full' for e in scanned if 'clave' in e}
+        errors = [e for e in scanned if 'error' in e] + [err for r in written for err in r.get('errores', [])]
+        self.journal['resumen'] = {
+            'registros_leidos': sum(1 for e in scanned if 'clave' in e),
+            'sistemas': len(entries),
+            'duplicados_eliminados': sum(1 for e in scanned if 'clave' in e) - len(entries),
+            'bytes_antes': sum(e.get('bytes', 0) for e in scanned),
+            'bytes_despues': sum(e.get('bytes', 0) for e in entries),
+            'descartados_por_perfil': dict(Counter(
+                str(profiles.get(path)) for r in written for path in r.get('descartados', []))),
+            'errores': errors,
+        }
+    
+    def _phase_limpieza(self, executor: Executor):
+        # Los ficheros ilegibles se apartan en vez de borrarse
+        corrupt_dir = self.root / CORRUPT_DIR
+        for err in self.journal['resumen']['errores']:
+            src = Path(err['archivo'])
+            try:
+                # Los shards antiguos ya se movieron a .compactacion/viejo en el commit
+                src = self.old_dir / src.relative_to(self.root / ARCHIVE_DIR)
+            except ValueError:
+                pass
+            if src.exists():
+                corrupt_dir.mkdir(exist_ok=True)
+                src.replace(corrupt_dir / f"{src.parent.name}_{src.name}")
+        
+        if self.old_dir.exists():
+            shutil.rmtree(self.old_dir)
+        for e in self._read_log(self.scan_log):
+            src = Path(e['archivo'])
+            if src.parent == self.root and src.exists():
+                src.unlink()
+        
+        stale = [*self.root.glob("all_systems*.json"), *self.root.glob("*.tmp")]
+        stale += [p for p in self.root.glob("latest_system*.json") if p.name != "latest_system.json"]
+        for path in stale:
+            path.unlink()
+    
+    def _phase_indices(self, executor: Executor):
+        loader = ArchiveIndexLoader(SystemArchive(self.root, self.journal['layout']))
+        loader.rebuild_all()
+        loader.close()
+
+
+INDEX_DIR = "index"
+MANIFEST_CHECK_BYTES = 4096
+
+
+class Fingerprint(NamedTuple):
+    """Hasta donde cubre un indice el archivo"""
+    legacy_files: int     # exports planos
+    legacy_mtime: int     # mtime maximo de los exports planos, en ns
+    manifest_offset: int  # bytes del manifiesto ya aplicados
+    manifest_crc: int     # crc32 de los ultimos bytes aplicados
+
+
+def archive_fingerprint(root: Path, offset: Optional[int] = None) -> Fingerprint:
+    """Huella del archivo hasta el byte offset del manifiesto (por defecto, hasta el final).
+
+    El manifiesto solo crece, asi que un indice guardado sigue valido
+    mientras sus ultimos bytes no cambien: basta con aplicarle las
+    lineas nuevas. Los exports planos solo cambian al migrar.
+    """
+    count = max_mtime = 0
+    for f in root.glob("system_*.json"):
+        try:
+            st = f.stat()
+        except OSError:
+            continue
+        count += 1
+        max_mtime = max(max_mtime, st.st_mtime_ns)
+    
+    manifest = root / MANIFEST_FILE
+    try:
+        size = manifest.stat().st_size
+    except OSError:
+        size = 0
+    if offset is None:
+        offset = size
+    crc = 0
+    if 0 < offset <= size:
+        start = max(0, offset - MANIFEST_CHECK_BYTES)
+        with open(manifest, 'rb') as f:
+            f.seek(start)
+            crc = zlib.crc32(f.read(offset - start))
+    return Fingerprint(count, max_mtime, offset, crc)
+
+
+class ArchiveIndex(ABC):
+    """Indice derivado del archivo, persistido en SystemData/index/.
+
+    offset es el byte del manifiesto hasta el que llegan los registros
+    aplicados; se guarda junto a la huella de ese punto.
+    """
+    name = "indice"
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self.offset = 0
+        self.saved_offset: Optional[int] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def dirty(self) -> bool:
+        return self.offset != self.saved_offset
+    
+    def advance(self, offset: int):
+        """Da por aplicado el manifiesto hasta offset (lineas sin registro legible)"""
+        with self._lock:
+            self.offset = max(self.offset, offset)
+    
+    @abstractmethod
+    def open(self) -> Optional[Fingerprint]:
+        """Abre el indice persistido y devuelve la huella con la que se guardo"""
+    
+    @abstractmethod
+    def rebuild(self, archive: SystemArchive, fingerprint: Fingerprint):
+        """Reconstruye el indice con el archivo hasta la huella y lo guarda"""
+    
+    @abstractmethod
+    def add(self, data: Dict[str, Any], offset: int) -> bool:
+        """Anade un registro cuya linea del manifiesto acaba en offset; True si conviene guardar ya"""
+    
+    @abstractmethod
+    def flush(self, root: Path):
+        """Guarda el indice con la huella de lo que cubre"""
+    
+    def close(self):
+        pass
+
+
+class SeedIndex(ArchiveIndex):
+    """Conjunto de seeds de sistema ya exportados.
+
+    El fichero es una cabecera y un array ordenado de uint64 que se
+    consulta con busqueda binaria sobre un mmap, sin cargarlo entero.
+    Los seeds nuevos se acumulan en memoria hasta el siguiente flush.
+    """
+    name = "seeds"
+    MAGIC = b'SXSEED02'
+    HEADER = struct.Struct('<8s5Q')  # magic, huella (4 campos), numero de seeds
+    ITEM = struct.Struct('<Q')
+    FLUSH_EVERY = 64
+    
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._mm: Optional[mmap.mmap] = None
+        self._count = 0
+        self._delta = set()
+    
+    @staticmethod
+    def _key(seed: int) -> int:
+        return seed & 0xFFFFFFFFFFFFFFFF
+    
+    def open(self) -> Optional[Fingerprint]:
+        with self._lock:
+            self._close_map()
+            try:
+                with open(self.path, 'rb') as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                return None
+            magic, *fingerprint, count = self.HEADER.unpack_from(mm, 0)
+            if magic != self.MAGIC or len(mm) != self.HEADER.size + count * self.ITEM.size:
+                mm.close()
+                logger.warning(f"{self.path.name} corrupto o de otra version, se reconstruira")
+                return None
+            self._mm, self._count = mm, count
+            fingerprint = Fingerprint(*fingerprint)
+            # Tras un flush puede haber registros posteriores ya en _delta
+            self.saved_offset = fingerprint.manifest_offset
+            self.offset = max(self.offset, self.saved_offset)
+            return fingerprint
+    
+    def __contains__(self, seed: int) -> bool:
+        key = self._key(seed)
+        with self._lock:
+            if key in self._delta:
+                return True
+            lo, hi = 0, self._count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                value = self.ITEM.unpack_from(self._mm, self.HEADER.size + mid * self.ITEM.size)[0]
+                if value < key:
+                    lo = mid + 1
+                elif value > key:
+                    hi = mid
+                else:
+                    return True
+            return False
+    
+    def add(self, data: Dict[str, Any], offset: int) -> bool:
+        seed = data.get('sistema', {}).get('seed')
+        with self._lock:
+            self.offset = max(self.offset, offset)
+            if isinstance(seed, int):
+                self._delta.add(self._key(seed))
+            return len(self._delta) >= self.FLUSH_EVERY
+    
+    def _manifest_seeds(self, archive: SystemArchive, start: int, end: int) -> Iterator[int]:
+        for entry in archive.iter_manifest(start, end):
+            if isinstance(entry.get('seed'), int):
+                yield self._key(entry['seed'])
+    
+    def rebuild(self, archive: SystemArchive, fingerprint: Fingerprint):
+        seeds = set(self._manifest_seeds(archive, 0, fingerprint.manifest_offset))
+        for f in archive.legacy_files():
+            try:
+                with open(f, 'r', encoding='utf-8') as fp:
+                    seed = json.load(fp).get('sistema', {}).get('seed')
+                if isinstance(seed, int):
+                    seeds.add(self._key(seed))
+            except Exception:
+                continue
+        with self._lock:
+            self._delta.clear()
+            self.offset = fingerprint.manifest_offset
+        self._write(seeds, fingerprint)
+    
+    def flush(self, root: Path):
+        with self._lock:
+            seeds = set(self._delta)
+            if self._mm is not None:
+                seeds.update(self.ITEM.unpack_from(self._mm, self.HEADER.size + i * self.ITEM.size)[0]
+                             for i in range(self._count))
+            offset = self.offset
+        self._write(seeds, archive_fingerprint(root, offset))
+    
+    def _write(self, seeds: Iterable[int], fingerprint: Fingerprint):
+        ordered = sorted(seeds)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, *fingerprint, len(ordered)))
+            f.write(struct.pack(f'<{len(ordered)}Q', *ordered))
+        written = set(ordered)
+        with self._lock:
+            # En Windows no se puede reemplazar un fichero mapeado
+            self._close_map()
+            tmp.replace(self.path)
+            self._delta -= written
+        self.open()
+    
+    def _close_map(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm, self._count = None, 0
+    
+    def close(self):
+        with self._lock:
+            self._close_map()
+
+
+class QuantileSketch:
+    """Sketch de cuantiles con error relativo acotado (estilo DDSketch).
+
+    Cada valor cae en un bucket logaritmico; el tamano solo depende del
+    rango de valores, no de cuantos se anadan.
+    """
+    
+    def __init__(self, alpha: float = 0.01):
+        self.alpha = alpha
+        self._gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self._gamma)
+        self.positive: Counter = Counter()
+        self.negative: Counter = Counter()
+        self.zeros = 0
+        self.count = 0
+    
+    def add(self, value: float):
+        self.count += 1
+        if abs(value) < 1e-9:
+            self.zeros += 1
+        elif value > 0:
+            self.positive[math.ceil(math.log(value) / self._log_gamma)] += 1
+        else:
+            self.negative[math.ceil(math.log(-value) / self._log_gamma)] += 1
+    
+    def _value(self, bucket: int) -> float:
+        return 2 * self._gamma ** bucket / (self._gamma + 1)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.negative, reverse=True):
+            seen += self.negative[bucket]
+            if seen > rank:
+                return -self._value(bucket)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for bucket in sorted(self.positive):
+            seen += self.positive[bucket]
+            if seen > rank:
+                return self._value(bucket)
+        return self._value(max(self.positive)) if self.positive else 0.0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {'alpha': self.alpha, 'ceros': self.zeros,
+                'pos': {str(k): v for k, v in self.positive.items()},
+                'neg': {str(k): v for k, v in self.negative.items()}}
+    
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> 'QuantileSketch':
+        sketch = cls(d.get('alpha', 0.01))
+        sketch.zeros = d.get('ceros', 0)
+        sketch.positive.update({int(k): v for k, v in d.get('pos', {}).items()})
+        sketch.negative.update({int(k): v for k, v in d.get('neg', {}).items()})
+        sketch.count = sketch.zeros + sum(sketch.positive.values()) + sum(sketch.negative.values())
+        return sketch
+
+
+class RunningStats:
+    """count/media/min/max exactos y cuantiles aproximados de una metrica"""
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.sketch = QuantileSketch()
+    
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.sketch.add(value)
+    
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'n': self.count,
+            'media': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p10': self.quantile(0.1),
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+        }
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Cuantil del sketch acotado al min/max exactos (el bucket puede pasarse)"""
+        value = self.sketch.quantile(q)
+        if value is None:
+            return None
+        return min(max(value, self.min), self.max)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {'n': self.count, 'suma': self.total, 'min': self.min, 'max': self.max,
+                'sketch': self.sketch.to_dict()}
+    
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> 'RunningStats':
+        stats = cls()
+        stats.count, stats.total = d['n'], d['suma']
+        stats.min, stats.max = d['min'], d['max']
+        stats.sketch = QuantileSketch.from_dict(d['sketch'])
+        return stats
+
+
+# Campos numericos de 'comercio' que se agregan por riqueza y clase
+TRADE_METRICS = (
+    'margen_compra', 'margen_venta', 'tasa_incremento_compra', 'tasa_decremento_venta',
+    'multiplicador_maximo_compra', 'multiplicador_minimo_venta',
+)
+FREQUENCY_VIEWS = ('riqueza', 'clase_comercio', 'tipo_estrella', 'bioma', 'recursos')
+
+
+class AggregateIndex(ArchiveIndex):
+    """Vistas agregadas de economia y biomas, actualizadas en cada export.
+
+    Cuenta sistemas unicos por seed: cuenta la primera captura de cada
+    sistema, y un sistema que ya esta en el indice de seeds no vuelve a
+    contar. Por eso add() debe llamarse antes de anadir el registro a seeds.
+    """
+    name = "agregados"
+    FLUSH_EVERY = 16
+    
+    def __init__(self, path: Path, seeds: Optional[SeedIndex] = None):
+        super().__init__(path)
+        self.seeds = seeds
+        self._reset()
+        self._unsaved = 0
+    
+    def _reset(self):
+        self.systems = 0
+        self.trade: Dict[str, Dict[str, RunningStats]] = {}
+        self.frequencies: Dict[str, Counter] = {view: Counter() for view in FREQUENCY_VIEWS}
+    
+    def _apply(self, data: Dict[str, Any]):
+        sistema = data.get('sistema', {})
+        self.systems += 1
+        freq = self.frequencies
+        if sistema.get('tipo_estrella'):
+            freq['tipo_estrella'][str(sistema['tipo_estrella'])] += 1
+        
+        comercio = sistema.get('comercio') or {}
+        wealth, trade_class = comercio.get('riqueza'), comercio.get('clase')
+        if wealth:
+            freq['riqueza'][wealth] += 1
+        if trade_class:
+            freq['clase_comercio'][trade_class] += 1
+        if wealth or trade_class:
+            group = self.trade.setdefault(f"{wealth or '?'}|{trade_class or '?'}", {})
+            for metric in TRADE_METRICS:
+                value = comercio.get(metric)
+                if isinstance(value, (int, float)) and math.isfinite(value):
+                    group.setdefault(metric, RunningStats()).add(float(value))
+        
+        for planet in data.get('planetas', []):
+            biome = planet.get('generacion', {}).get('bioma')
+            if biome is not None:
+                freq['bioma'][str(biome)] += 1
+            for res in (*planet.get('recursos_basicos', ()), *planet.get('recursos_extra', ())):
+                freq['recursos'][res] += 1
+    
+    def add(self, data: Dict[str, Any], offset: int) -> bool:
+        seed = data.get('sistema', {}).get('seed')
+        known = isinstance(seed, int) and self.seeds is not None and seed in self.seeds
+        with self._lock:
+            if not known:
+                self._apply(data)
+                self._unsaved += 1
+            self.offset = max(self.offset, offset)
+            return self._unsaved >= self.FLUSH_EVERY
+    
+    def rebuild(self, archive: SystemArchive, fingerprint: Fingerprint):
+        fresh = AggregateIndex(self.path)
+        # Los exports planos son anteriores al manifiesto: su captura es la primera
+        paths = itertools.chain(archive.legacy_files(), archive.record_paths(0, fingerprint.manifest_offset))
+        seen = set()
+        for data in archive.iter_records(paths):
+            seed = data.get('sistema', {}).get('seed')
+            if isinstance(seed, int):
+                if seed in seen:
+                    continue
+                seen.add(seed)
+            fresh._apply(data)
+        with self._lock:
+            self.systems, self.trade, self.frequencies = fresh.systems, fresh.trade, fresh.frequencies
+            self.offset = fingerprint.manifest_offset
+        self._save(fingerprint)
+    
+    def open(self) -> Optional[Fingerprint]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                d = json.load(f)
+            fingerprint = Fingerprint(*d['huella'])
+            with self._lock:
+                self._reset()
+                self.systems = d['sistemas']
+                self.trade = {key: {m: RunningStats.from_dict(v) for m, v in group.items()}
+                              for key, group in d['comercio'].items()}
+                for view in FREQUENCY_VIEWS:
+                    self.frequencies[view].update(d['frecuencias'].get(view, {}))
+                self.offset = self.saved_offset = fingerprint.manifest_offset
+            return fingerprint
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+    
+    def flush(self, root: Path):
+        with self._lock:
+            offset = self.offset
+        self._save(archive_fingerprint(root, offset))
+    
+    def _save(self, fingerprint: Fingerprint):
+        with self._lock:
+            # Solo se guarda si nada ha avanzado desde que se calculo la huella
+            if self.offset != fingerprint.manifest_offset:
+                return
+            d = {
+                'huella': list(fingerprint),
+                'sistemas': self.systems,
+                'comercio': {key: {m: stats.to_dict() for m, stats in group.items()}
+                             for key, group in self.trade.items()},
+                'frecuencias': {view: dict(c) for view, c in self.frequencies.items()},
+            }
+            self._unsaved = 0
+            self.saved_offset = self.offset
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(d, f, ensure_ascii=False, separators=(',', ':'))
+        tmp.replace(self.path)
+    
+    def query(self, view: str = 'comercio', top: int = 10) -> Dict[str, Any]:
+        """Resumen de una vista: 'comercio' o una de FREQUENCY_VIEWS"""
+        with self._lock:
+            if view == 'comercio':
+                return {key: {m: stats.summary() for m, stats in sorted(group.items())}
+                        for key, group in sorted(self.trade.items())}
+            if view not in self.frequencies:
+                raise ValueError(f"Vista desconocida: {view}")
+            return dict(self.frequencies[view].most_common(top))
+    
+    def headline(self) -> str:
+        """Resumen de una linea para la GUI"""
+        with self._lock:
+            biome = self.frequencies['bioma'].most_common(1)
+            buy = [group['margen_compra'] for group in self.trade.values() if 'margen_compra' in group]
+        parts = [f"{self.systems} sistemas"]
+        if biome:
+            parts.append(f"bioma top: {biome[0][0]}")
+        if buy:
+            n = sum(s.count for s in buy)
+            parts.append(f"margen compra medio: {sum(s.total for s in buy) / n:.3f} (n={n})")
+        return " | ".join(parts)
+
+
+class ArchiveIndexLoader:
+    """Abre los indices persistidos y los pone al dia en segundo plano.
+
+    Los agregados dependen del indice de seeds para no contar dos veces
+    un sistema, asi que ambos se aplican y se guardan juntos, con la
+    misma huella. Si el manifiesto solo ha crecido desde que se guardaron
+    se les aplican las lineas nuevas; si no, se reconstruyen. Hasta que
+    termina (ready), las consultas devuelven None y quien las usa debe
+    comportarse como si no hubiera indice.
+    """
+    
+    def __init__(self, archive: SystemArchive):
+        self.archive = archive
+        self.index_dir = archive.root / INDEX_DIR
+        self.seeds = SeedIndex(self.index_dir / "seeds.idx")
+        self.aggregates = AggregateIndex(self.index_dir / "aggregates.json", self.seeds)
+        # Los agregados miran los seeds antes de que se anada el nuevo
+        self.indexes: List[ArchiveIndex] = [self.aggregates, self.seeds]
+        self.ready = threading.Event()
+        self.failed = False
+        self._thread: Optional[threading.Thread] = None
+        # Exports recibidos mientras se preparan los indices: (registro, offset)
+        self._pending: Optional[List[Tuple[Dict[str, Any], int]]] = []
+        self._covered = 0
+        self._pending_lock = threading.Lock()
+        self._apply_lock = threading.Lock()
+        self._flush_thread: Optional[threading.Thread] = None
+        self._flush_lock = threading.Lock()
+    
+    def start(self):
+        self._thread = threading.Thread(target=self.warm_up, name="ArchiveIndexWarmUp", daemon=True)
+        self._thread.start()
+    
+    def warm_up(self):
+        """Abre y pone al dia los indices; start() lo lanza en segundo plano"""
+        covered = 0
+        try:
+            current = archive_fingerprint(self.archive.root)
+            covered = current.manifest_offset
+            saved = self.aggregates.open()
+            if saved is None or not self._extends(saved, current):
+                logger.info(f"Indice '{self.aggregates.name}' obsoleto, reconstruyendo...")
+                self.aggregates.rebuild(self.archive, current)
+                saved = current
+            if self.seeds.open() != saved:
+                logger.info(f"Indice '{self.seeds.name}' desalineado, reconstruyendo...")
+                self.seeds.rebuild(self.archive, saved)
+            if saved.manifest_offset < current.manifest_offset:
+                logger.info(f"Indices: aplicando {current.manifest_offset - saved.manifest_offset} "
+                            f"bytes nuevos del manifiesto")
+                self._catch_up(saved.manifest_offset, current.manifest_offset)
+            logger.info("Indices del archivo listos")
+        except Exception as e:
+            # No se guardan: en el siguiente arranque se vuelven a preparar
+            self.failed = True
+            logger.error(f"Error preparando indices: {e}")
+        finally:
+            with self._pending_lock:
+                pending, self._pending = self._pending, None
+                self._covered = covered
+                self.ready.set()
+            for data, offset in pending:
+                self._add(data, offset)
+    
+    def _extends(self, saved: Fingerprint, current: Fingerprint) -> bool:
+        """True si el archivo actual es el de la huella guardada mas lineas nuevas"""
+        return (saved.manifest_offset <= current.manifest_offset
+                and archive_fingerprint(self.archive.root, saved.manifest_offset) == saved)
+    
+    def _catch_up(self, start: int, end: int):
+        """Aplica las lineas del manifiesto entre start y end y guarda los indices"""
+        for entry, offset in self.archive.iter_manifest_lines(start, end):
+            data = next(self.archive.iter_records([self.archive.root / entry['ruta']]), None)
+            if data is not None:
+                self._apply(data, offset)
+                continue
+            # Registro ilegible: los agregados no lo cuentan, el seed del manifiesto si vale
+            self.aggregates.advance(offset)
+            self.seeds.add({'sistema': {'seed': entry.get('seed')}}, offset)
+        for index in self.indexes:
+            index.advance(end)
+        self.flush()
+    
+    def rebuild_all(self):
+        """Reconstruye todos los indices (p.ej. tras compactar el archivo)"""
+        fingerprint = archive_fingerprint(self.archive.root)
+        with self._apply_lock:
+            self.aggregates.rebuild(self.archive, fingerprint)
+            self.seeds.rebuild(self.archive, fingerprint)
+    
+    def known_seed(self, seed: int) -> Optional[bool]:
+        """True/False si el seed esta en el archivo, None si aun no se sabe"""
+        if not self.ready.is_set():
+            return None
+        return seed in self.seeds
+    
+    def record_export(self, data: Dict[str, Any], offset: int):
+        """Anota un registro cuya linea del manifiesto acaba en el byte offset"""
+        with self._pending_lock:
+            if self._pending is not None:
+                self._pending.append((data, offset))
+                return
+        self._add(data, offset)
+    
+    def _apply(self, data: Dict[str, Any], offset: int) -> bool:
+        """Anade el registro a todos los indices; True si conviene guardar ya"""
+        due = False
+        with self._apply_lock:
+            for index in self.indexes:
+                due = index.add(data, offset) or due
+        return due
+    
+    def _add(self, data: Dict[str, Any], offset: int):
+        # La preparacion ya leyo del manifiesto hasta _covered; esto incluye un
+        # registro escrito antes de leerlo pero anotado despues de ready
+        if offset <= self._covered:
+            return
+        try:
+            if self._apply(data, offset) and not self.failed:
+                self._schedule_flush()
+        except Exception as e:
+            logger.error(f"Error actualizando indices: {e}")
+    
+    def flush(self):
+        """Guarda todos los indices con la misma huella"""
+        with self._apply_lock:
+            for index in self.indexes:
+                index.flush(self.archive.root)
+    
+    def _schedule_flush(self):
+        def run():
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error guardando indices: {e}")
+            finally:
+                with self._flush_lock:
+                    self._flush_thread = None
+        
+        with self._flush_lock:
+            if self._flush_thread is not None:
+                return
+            self._flush_thread = threading.Thread(target=run, name="IndexFlush", daemon=True)
+            self._flush_thread.start()
+    
+    def aggregate(self, view: str = 'comercio', top: int = 10) -> Optional[Dict[str, Any]]:
+        """Vista agregada, o None si los indices aun se estan preparando"""
+        if not self.ready.is_set():
+            return None
+        return self.aggregates.query(view, top)
+    
+    def close(self):
+        """Guarda los indices con cambios pendientes y los cierra"""
+        with self._flush_lock:
+            running = self._flush_thread
+        if running is not None:
+            running.join()
+        if self.ready.is_set() and not self.failed and any(index.dirty for index in self.indexes):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error guardando indices: {e}")
+        for index in self.indexes:
+            index.close()
+
+
+LATEST_FILE = "latest_system.json"
+
+
+class ExportSink(ABC):
+    """Destino de los registros exportados.
+
+    Cada sink recibe los registros por lotes: se escribe cuando hay
+    max_records pendientes o cuando el mas antiguo lleva max_latency
+    segundos esperando. write_batch se llama siempre desde un hilo del
+    pool de escritura y nunca en paralelo para el mismo sink.
+    """
+    kind = "sink"
+    
+    def __init__(self, root: Path, max_records: int = 1, max_latency: float = 0.0):
+        self.root = root
+        self.max_records = max(1, int(max_records))
+        self.max_latency = float(max_latency)
+        self.name = self.kind
+    
+    @abstractmethod
+    def write_batch(self, records: List[Dict[str, Any]]):
+        """Escribe un lote; si lanza una excepcion el lote se da por perdido"""
+    
+    def close(self):
+        pass
+
+
+class ArchiveSink(ExportSink):
+    """Un JSON por sistema en el archivo sharded, manifiesto, indices y latest_system.json"""
+    kind = "json"
+    
+    def __init__(self, root: Path, archive: SystemArchive, indexes: ArchiveIndexLoader, **options):
+        super().__init__(root, **options)
+        self.archive = archive
+        self.indexes = indexes
+    
+    def write_batch(self, records: List[Dict[str, Any]]):
+        for data in records:
+            rel = self.archive.write_record(data)
+            offset = self.archive.append_manifest(self.archive.manifest_entry(data, rel))
+            self.indexes.record_export(data, offset)
+            logger.info(f"Guardado: {rel.as_posix()}")
+        
+        tmp = self.root / (LATEST_FILE + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(records[-1], f, indent=2, ensure_ascii=False, default=str)
+        tmp.replace(self.root / LATEST_FILE)
+
+
+class NdjsonSessionSink(ExportSink):
+    """Una linea por registro en sesiones/sesion_<inicio>.ndjson"""
+    kind = "ndjson"
+    
+    def __init__(self, root: Path, max_records: int = 50, max_latency: float = 2.0):
+        super().__init__(root, max_records, max_latency)
+        self.path = root / "sesiones" / f"sesion_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson"
+    
+    def write_batch(self, records: List[Dict[str, Any]]):
+        self.path.parent.mkdir(exist_ok=True)
+        lines = ''.join(json.dumps(r, ensure_ascii=False, default=str) + '\n' for r in records)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+
+class SqliteSink(ExportSink):
+    """Tabla 'sistemas' en SystemData/systems.db, un INSERT por lote"""
+    kind = "sqlite"
+    
+    def __init__(self, root: Path, max_records: int = 100, max_latency: float = 5.0,
+                 file: str = "systems.db"):
+        super().__init__(root, max_records, max_latency)
+        self.path = root / file
+        self._conn: Optional[sqlite3.Connection] = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Cada lote puede ir a un hilo distinto del pool, pero nunca dos a la vez
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sistemas ("
+                "id TEXT PRIMARY KEY, seed INTEGER, nombre TEXT, timestamp TEXT, perfil TEXT, datos TEXT)")
+        return self._conn
+    
+    def write_batch(self, records: List[Dict[str, Any]]):
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO sistemas VALUES (?, ?, ?, ?, ?, ?)",
+                [(r['id'], r['sistema'].get('seed'), r['sistema'].get('nombre'), r.get('timestamp'),
+                  r.get('perfil'), json.dumps(r, ensure_ascii=False, default=str)) for r in records])
+    
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class SegmentSink(ExportSink):
+    """NDJSON comprimido con gzip; se abre segmento nuevo entre lotes al pasar de segment_records"""
+    kind = "segments"
+    
+    def __init__(self, root: Path, max_records: int = 200, max_latency: float = 30.0,
+                 segment_records: int = 5000):
+        super().__init__(root, max_records, max_latency)
+        self.dir = root / "segmentos"
+        self.segment_records = segment_records
+        self._segment: Optional[Path] = None
+        self._written = 0
+    
+    def write_batch(self, records: List[Dict[str, Any]]):
+        if self._segment is None or self._written >= self.segment_records:
+            self.dir.mkdir(exist_ok=True)
+            self._segment = self.dir / f"seg_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.ndjson.gz"
+            self._written = 0
+        data = ''.join(json.dumps(r, ensure_ascii=False, default=str) + '\n' for r in records)
+        # Cada lote es un miembro gzip nuevo; gzip los lee concatenados
+        with gzip.open(self._segment, 'ab') as f:
+            f.write(data.encode('utf-8'))
+        self._written += len(records)
+
+
+class SocketSink(ExportSink):
+    """Envia cada registro como un datagrama UDP JSON a un puerto local (sin garantia de entrega)"""
+    kind = "socket"
+    
+    def __init__(self, root: Path, max_records: int = 1, max_latency: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 47810):
+        super().__init__(root, max_records, max_latency)
+        self.address = (host, int(port))
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    
+    def write_batch(self, records: List[Dict[str, Any]]):
+        for r in records:
+            self._sock.sendto(json.dumps(r, ensure_ascii=False, separators=(',', ':'),
+                                         default=str).encode('utf-8'), self.address)
+    
+    def close(self):
+        self._sock.close()
+
+
+SINK_TYPES = {cls.kind: cls for cls in (ArchiveSink, NdjsonSessionSink, SqliteSink, SegmentSink, SocketSink)}
+
+
+class _SinkState:
+    def __init__(self, sink: ExportSink):
+        self.sink = sink
+        self.queue: deque = deque()
+        self.busy = False
+        self.latency = RunningStats()
+        self.batches = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+
+class SinkDispatcher:
+    """Reparte cada registro a todos los sinks en un pool de escritura compartido.
+
+    submit() solo anade el registro a una cola; un hilo planificador lo
+    copia a la cola de cada sink y lanza los lotes cuando toca. Un error
+    en un sink no afecta a los demas.
+    """
+    
+    def __init__(self, sinks: List[ExportSink], workers: int = 2):
+        seen = Counter()
+        for sink in sinks:
+            seen[sink.kind] += 1
+            if seen[sink.kind] > 1:
+                sink.name = f"{sink.kind}#{seen[sink.kind]}"
+        self._states = [_SinkState(sink) for sink in sinks]
+        self._inbox: deque = deque()
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="SinkWriter")
+        self._flushing = False
+        self._closed = False
+        self._scheduler = threading.Thread(target=self._schedule_loop, name="SinkScheduler", daemon=True)
+        self._scheduler.start()
+    
+    def submit(self, record: Dict[str, Any]):
+        with self._cond:
+            self._inbox.append((time.perf_counter(), record))
+            self._cond.notify_all()
+    
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._inbox) * len(self._states) + sum(
+                len(st.queue) + st.busy for st in self._states)
+    
+    def _schedule_loop(self):
+        with self._cond:
+            while True:
+                while self._inbox:
+                    item = self._inbox.popleft()
+                    for st in self._states:
+                        st.queue.append(item)
+                
+                now = time.perf_counter()
+                wait = None
+                for st in self._states:
+                    if st.busy or not st.queue:
+                        continue
+                    due = st.queue[0][0] + st.sink.max_latency
+                    if self._flushing or len(st.queue) >= st.sink.max_records or now >= due:
+                        batch = [st.queue.popleft() for _ in range(min(len(st.queue), st.sink.max_records))]
+                        st.busy = True
+                        self._pool.submit(self._run_batch, st, batch)
+                    else:
+                        wait = due - now if wait is None else min(wait, due - now)
+                
+                if self._closed and not self._inbox and not any(st.queue or st.busy for st in self._states):
+                    return
+                self._cond.wait(wait)
+    
+    def _run_batch(self, st: _SinkState, batch: List[Tuple[float, Dict[str, Any]]]):
+        try:
+            st.sink.write_batch([record for _, record in batch])
+            done = time.perf_counter()
+            for queued, _ in batch:
+                st.latency.add(done - queued)
+            st.batches += 1
+        except Exception as e:
+            st.errors += 1
+            st.last_error = str(e)
+            logger.error(f"Sink '{st.sink.name}': {len(batch)} registros perdidos: {e}")
+        finally:
+            with self._cond:
+                st.busy = False
+                self._cond.notify_all()
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Escribe ya todo lo pendiente y espera a que termine"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            try:
+                while self._inbox or any(st.queue or st.busy for st in self._states):
+                    remaining = None if deadline is None else deadline - time.perf_counter()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                return True
+            finally:
+                self._flushing = False
+    
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._flushing = True
+            self._cond.notify_all()
+        self._scheduler.join()
+        self._pool.shutdown(wait=True)
+        for st in self._states:
+            try:
+                st.sink.close()
+            except Exception as e:
+                logger.error(f"Error cerrando sink '{st.sink.name}': {e}")
+    
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            st.sink.name: {
+                'pendientes': len(st.queue),
+                'lotes': st.batches,
+                'errores': st.errors,
+                'ultimo_error': st.last_error,
+                'latencia_s': st.latency.summary(),
+            }
+            for st in self._states
+        }
+
+
+def build_sinks(config: List[Dict[str, Any]], root: Path, archive: SystemArchive,
+                indexes: ArchiveIndexLoader) -> List[ExportSink]:
+    """Crea los sinks de la lista 'sinks' de exporter_config.json"""
+    sinks = []
+    for entry in config:
+        if not isinstance(entry, dict):
+            logger.warning(f"{CONFIG_FILE}: cada sink debe ser un objeto con 'type', no {entry!r}")
+            continue
+        options = dict(entry)
+        kind = options.pop('type', None)
+        if kind not in SINK_TYPES:
+            logger.warning(f"{CONFIG_FILE}: sink desconocido '{kind}'")
+            continue
+        try:
+            if kind == ArchiveSink.kind:
+                sinks.append(ArchiveSink(root, archive, indexes, **options))
+            else:
+                sinks.append(SINK_TYPES[kind](root, **options))
+        except Exception as e:
+            logger.error(f"No se pudo crear el sink '{kind}': {e}")
+    if not any(isinstance(sink, ArchiveSink) for sink in sinks):
+        # Exports sigue contando lo encolado, pero nada llega al archivo ni a latest_system.json
+        logger.warning(f"Sin sink '{ArchiveSink.kind}': los exports no se guardan en el archivo")
+    return sinks
+
+
+DEBUG_DIR = "debug"
+SCHEMA_BASELINE_FILE = "schema_baseline.json"
+
+
+class FieldSchema(NamedTuple):
+    name: str
+    ctype: type
+    offset: int
+    size: int
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {'nombre': self.name, 'tipo': getattr(self.ctype, '__name__', str(self.ctype)),
+                'offset': self.offset, 'tamaño': self.size}
+
+
+@lru_cache(maxsize=None)
+def type_schema(ctype: type) -> Tuple[FieldSchema, ...]:
+    """Campos de una estructura ctypes (incluidos los heredados), cacheado por tipo"""
+    fields = []
+    for base in reversed(ctype.__mro__):
+        for entry in base.__dict__.get('_fields_', ()):
+            name, ftype = entry[0], entry[1]
+            desc = getattr(ctype, name)
+            fields.append(FieldSchema(name, ftype, desc.offset, desc.size))
+    return tuple(fields)
+
+
+def collect_schemas(ctype: type, out: Optional[Dict[str, List[Dict[str, Any]]]] = None
+                    ) -> Dict[str, List[Dict[str, Any]]]:
+    """Esquemas de ctype y de todas las estructuras anidadas, por nombre de tipo"""
+    out = {} if out is None else out
+    if ctype.__name__ in out:
+        return out
+    out[ctype.__name__] = [f.as_dict() for f in type_schema(ctype)]
+    for f in type_schema(ctype):
+        inner = f.ctype
+        while issubclass(inner, ctypes.Array):
+            inner = inner._type_
+        if issubclass(inner, ctypes.Structure):
+            collect_schemas(inner, out)
+    return out
+
+
+# Codigos _type_ de c_char_p, c_wchar_p y c_void_p: su .value desreferencia el puntero copiado
+POINTER_TYPE_CODES = frozenset('zZP')
+
+
+def decode_raw(ctype: type, raw: bytes, depth: int = 0) -> Any:
+    """Decodifica una copia en bytes de una estructura, sin tocar memoria del juego"""
+    if issubclass(ctype, ctypes.Structure) and depth < 4:
+        return {f.name: decode_raw(f.ctype, raw[f.offset:f.offset + f.size], depth + 1)
+                for f in type_schema(ctype)}
+    try:
+        if issubclass(ctype, ctypes.Array):
+            if ctype._type_ is ctypes.c_char:
+                return raw.split(b'\x00', 1)[0].decode('utf-8', errors='replace')
+            size = ctypes.sizeof(ctype._type_)
+            if ctype._length_ <= 64:
+                return [decode_raw(ctype._type_, raw[i * size:(i + 1) * size], depth + 1)
+                        for i in range(ctype._length_)]
+        elif issubclass(ctype, ctypes._SimpleCData) and ctype._type_ not in POINTER_TYPE_CODES:
+            value = ctype.from_buffer_copy(raw)
+            if hasattr(value, 'name'):
+                return value.name.rstrip('_')
+            value = value.value
+            if isinstance(value, IntEnum):
+                return value.name.rstrip('_')
+            if isinstance(value, bytes):
+                return value.decode('utf-8', errors='replace')
+            return value
+    except Exception:
+        pass
+    # Punteros, arrays grandes y tipos desconocidos: bytes en hexadecimal
+    return raw[:256].hex() + ('...' if len(raw) > 256 else '')
+
+
+def diff_schemas(old: Dict[str, List[Dict[str, Any]]],
+                 new: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Campos anadidos, eliminados o movidos entre dos conjuntos de esquemas"""
+    report = {}
+    for type_name in sorted(set(old) | set(new)):
+        if type_name not in new:
+            report[type_name] = {'tipo_eliminado': True}
+            continue
+        if type_name not in old:
+            report[type_name] = {'tipo_nuevo': True}
+            continue
+        before = {f['nombre']: f for f in old[type_name]}
+        after = {f['nombre']: f for f in new[type_name]}
+        changes = {
+            'anadidos': sorted(set(after) - set(before)),
+            'eliminados': sorted(set(before) - set(after)),
+            'modificados': {
+                name: {'antes': before[name], 'despues': after[name]}
+                for name in sorted(set(before) & set(after)) if before[name] != after[name]
+            },
+        }
+        if any(changes.values()):
+            report[type_name] = changes
+    return report
+
+
+def nmspy_version() -> Optional[str]:
+    try:
+        from importlib.metadata import version
+        return version("nmspy")
+    except Exception:
+        return None
+
+
+PROFILES_DIR = "profiles"
+PROFILER_MODES = ('cprofile', 'sampling')
+
+
+class ModProfiler:
+    """Perfilador bajo demanda del codigo propio del mod.
+
+    Solo mide dentro de las funciones marcadas con @profiled. En modo
+    'cprofile' cada hilo usa su propio cProfile.Profile; en ambos modos
+    un hilo muestrea las pilas de los hilos que estan dentro del mod y
+    genera un fichero de pilas colapsadas (formato flamegraph.pl).
+    """
+    
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.active = False
+        self.mode = 'cprofile'
+        self.last_summary = ""
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inside: Dict[int, int] = {}
+        self._profiles: Dict[int, cProfile.Profile] = {}
+        self._samples: Counter = Counter()
+        self._skipped = 0
+        self._sampler: Optional[threading.Thread] = None
+        self._started = 0.0
+    
+    def start(self, mode: str = 'cprofile'):
+        if mode not in PROFILER_MODES:
+            raise ValueError(f"Modo de perfilado desconocido: {mode}")
+        with self._lock:
+            self.mode = mode
+            self._profiles.clear()
+            self._samples.clear()
+            self._skipped = 0
+            self._started = time.perf_counter()
+            self.active = True
+        self._sampler = threading.Thread(target=self._sample_loop, name="ModProfilerSampler", daemon=True)
+        self._sampler.start()
+    
+    def stop(self, out_dir: Path) -> List[str]:
+        """Detiene el perfilado, escribe los ficheros y devuelve el resumen"""
+        self.active = False
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+        elapsed = time.perf_counter() - self._started
+        
+        out_dir.mkdir(parents=True, exist_ok=True)
+        stem = out_dir / f"perfil_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{self.mode}"
+        
+        with self._lock:
+            profiles = list(self._profiles.values())
+            samples = Counter(self._samples)
+        
+        summary = [f"Perfil {self.mode}: {elapsed:.1f}s, {sum(samples.values())} muestras"]
+        if self._skipped:
+            summary.append(f"  {self._skipped} secciones sin cProfile (otro perfilador activo)")
+        # Las pilas van primero: no dependen de que pstats pueda fusionar los perfiles
+        if samples:
+            with open(stem.with_suffix('.collapsed'), 'w', encoding='utf-8') as f:
+                for stack, count in sorted(samples.items()):
+                    f.write(f"{stack} {count}\n")
+        
+        stats = None
+        for prof in profiles:
+            try:
+                prof.create_stats()
+                if not prof.stats:
+                    continue
+                if stats is None:
+                    stats = pstats.Stats(prof)
+                else:
+                    stats.add(prof)
+            except (TypeError, ValueError) as e:
+                logger.debug(f"Perfil de hilo descartado: {e}")
+        top = []
+        if stats is not None:
+            stats.dump_stats(str(stem.with_suffix('.pstats')))
+            top = self._top_functions(stats)
+        elif samples:
+            top = self._top_samples(samples)
+        summary.extend(top)
+        
+        self.last_summary = top[0].strip() if top else summary[0]
+        return summary
+    
+    @staticmethod
+    def _top_functions(stats: pstats.Stats, limit: int = 10) -> List[str]:
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+        lines = []
+        for (filename, line, func), (_, calls, own, cumulative, _) in rows:
+            lines.append(f"  {cumulative * 1000:9.2f} ms acum {own * 1000:9.2f} ms propio "
+                         f"{calls:7d}x  {func} ({Path(filename).name}:{line})")
+        return lines
+    
+    @staticmethod
+    def _top_samples(samples: Counter, limit: int = 10) -> List[str]:
+        leaves = Counter()
+        for stack, count in samples.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaves.values())
+        return [f"  {count * 100 / total:5.1f}%  {frame}" for frame, count in leaves.most_common(limit)]
+    
+    def enter(self):
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        if depth:
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            self._inside[ident] = self._inside.get(ident, 0) + 1
+            prof = self._profiles.get(ident)
+        self._local.profile = None
+        if self.mode != 'cprofile':
+            return
+        new = prof is None
+        if new:
+            prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # Python 3.12+: solo puede haber un cProfile activo a la vez
+            with self._lock:
+                self._skipped += 1
+            return
+        self._local.profile = prof
+        if new:
+            # Solo se guardan los perfiles que han llegado a activarse
+            with self._lock:
+                self._profiles[ident] = prof
+    
+    def exit(self):
+        self._local.depth -= 1
+        if self._local.depth:
+            return
+        prof = getattr(self._local, 'profile', None)
+        if prof is not None:
+            prof.disable()
+            self._local.profile = None
+        ident = threading.get_ident()
+        with self._lock:
+            self._inside[ident] -= 1
+            if not self._inside[ident]:
+                del self._inside[ident]
+    
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while self.active:
+            frames = sys._current_frames()
+            with self._lock:
+                idents = [i for i in self._inside if i != own]
+            for ident in idents:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    with self._lock:
+                        self._samples[';'.join(reversed(stack))] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+PROFILER = ModProfiler()
+
+
+def profiled(func):
+    """Marca un metodo del mod para que lo mida PROFILER cuando esta activo"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not PROFILER.active:
+            return func(*args, **kwargs)
+        PROFILER.enter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            PROFILER.exit()
+    return wrapper
+
+
+def timed_stage(stage: str):
+    """Acumula la duracion del metodo en self.stage_stats[stage]"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.stage_stats.setdefault(stage, RunningStats()).add(elapsed)
+        return wrapper
+    return decorator
+
+
+def dynamic_array_parts(arr) -> Optional[Tuple[int, int, type, int]]:
+    """(puntero a datos, numero de elementos, tipo de elemento, offset del puntero)
+    de un cTkDynamicArray, o None si no se reconoce su layout"""
+    arr_type = type(arr)
+    elem_type = getattr(arr_type, '_template_type', None)
+    if elem_type is None:
+        return None
+    for ptr_name, size_name in (('Array', 'Size'), ('mArray', 'miSize')):
+        if hasattr(arr_type, ptr_name) and hasattr(arr_type, size_name):
+            ptr = getattr(arr, ptr_name)
+            if not isinstance(ptr, int):
+                ptr = ctypes.cast(ptr, ctypes.c_void_p).value or 0
+            return ptr, int(getattr(arr, size_name)), elem_type, getattr(arr_type, ptr_name).offset
+    return None
+
+
+# Mas elementos que esto en un array dinamico es memoria sin inicializar
+MAX_DYNAMIC_ARRAY = 1024
+
+
+def read_dynamic_array(arr) -> Optional[Tuple[bytes, int, type]]:
+    """Copia de una vez el buffer de un cTkDynamicArray: (bytes, numero, tipo de elemento)"""
+    parts = dynamic_array_parts(arr)
+    if parts is None:
+        return None
+    ptr, count, elem_type, _ = parts
+    if not ptr or not 0 < count <= MAX_DYNAMIC_ARRAY:
+        return b'', 0, elem_type
+    return ctypes.string_at(ptr, count * ctypes.sizeof(elem_type)), count, elem_type
+
+
+def decode_fixed_strings(raw: bytes, stride: int, offset: int, width: int, count: int) -> List[str]:
+    """Decodifica el campo de texto fijo [offset, offset+width) de count elementos contiguos"""
+    view = memoryview(raw)
+    out = []
+    for start in range(offset, offset + stride * count, stride):
+        text = bytes(view[start:start + width]).split(b'\x00', 1)[0]
+        text = text.decode('utf-8', errors='ignore').strip()
+        if text:
+            out.append(text)
+    return out
+
+
+@lru_cache(maxsize=None)
+def field_offset(ctype: type, path: str) -> Tuple[int, type]:
+    """Offset y tipo de un campo anidado ('a.b.c') dentro de ctype"""
+    offset = 0
+    for name in path.split('.'):
+        field = next((f for f in type_schema(ctype) if f.name == name), None)
+        if field is None:
+            raise AttributeError(f"{ctype.__name__}.{name}")
+        offset += field.offset
+        ctype = field.ctype
+    return offset, ctype
+
+
+@lru_cache(maxsize=None)
+def planet_slot_layout(planet_type: type) -> Optional[Tuple[int, int]]:
+    """Offsets dentro de cGcPlanet del seed de generacion y del primer byte del nombre"""
+    try:
+        seed, seed_type = field_offset(planet_type, 'mPlanetGenerationInputData.Seed.Seed')
+        name, _ = field_offset(planet_type, 'mPlanetData.Name')
+    except AttributeError:
+        return None
+    return (seed, name) if ctypes.sizeof(seed_type) == 8 else None
+
+
+TRACES_DIR = "traces"
+TRACE_VERSION = 1
+
+
+class HookTraceRecorder:
+    """Graba la secuencia y el tiempo de on_update/on_system_load en NDJSON.
+
+    Para on_system_load guarda tambien los bytes de cGcSolarSystem
+    (zlib + base64) y el contenido de los ExtraResourceHints de cada
+    planeta, que viven fuera de la estructura. La escritura se hace en
+    un hilo aparte para no frenar los hooks. Si un evento no se puede
+    leer se cuenta en errors: un fallo del grabador nunca llega al hook.
+    """
+    
+    def __init__(self):
+        self.active = False
+        self.errors = 0
+        self.path: Optional[Path] = None
+        self._t0 = 0.0
+        self._queue: queue.Queue = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+    
+    def start(self, out_dir: Path) -> Path:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        self.path = out_dir / f"traza_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson"
+        self._t0 = time.perf_counter()
+        self.errors = 0
+        self._queue.put({'tipo': 'cabecera', 'version': TRACE_VERSION, 'nmspy': nmspy_version(),
+                         'tamaño_sistema': ctypes.sizeof(nms.cGcSolarSystem)})
+        self._writer = threading.Thread(target=self._write_loop, args=(self.path,),
+                                        name="HookTraceWriter", daemon=True)
+        self._writer.start()
+        self.active = True
+        return self.path
+    
+    def stop(self):
+        self.active = False
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+    
+    def _write_loop(self, path: Path):
+        with open(path, 'w', encoding='utf-8') as f:
+            while True:
+                event = self._queue.get()
+                if event is None:
+                    break
+                f.write(json.dumps(event, separators=(',', ':')) + '\n')
+    
+    def _failed(self, hook: str, error: Exception):
+        self.errors += 1
+        if self.errors == 1:
+            logger.warning(f"Traza: no se pudo grabar {hook}: {error}")
+    
+    def record_update(self, this):
+        try:
+            sim = this.contents
+            solar = ctypes.cast(sim.mpSolarSystem, ctypes.c_void_p).value or 0
+            self._queue.put({'t': time.perf_counter() - self._t0, 'hook': 'on_update', 'sistema': solar})
+        except Exception as e:
+            self._failed('on_update', e)
+    
+    def record_system_load(self, this):
+        try:
+            self._record_system_load(this)
+        except Exception as e:
+            self._failed('on_system_load', e)
+    
+    def _record_system_load(self, this):
+        t = time.perf_counter() - self._t0
+        solar = this.contents
+        base = ctypes.addressof(solar)
+        raw = ctypes.string_at(base, ctypes.sizeof(solar))
+        
+        arrays = []
+        for planet in solar.maPlanets:
+            parts = dynamic_array_parts(planet.mPlanetData.ExtraResourceHints)
+            if not parts or not parts[0] or parts[1] <= 0:
+                continue
+            ptr, count, elem_type, ptr_offset = parts
+            arrays.append({
+                'offset': ctypes.addressof(planet.mPlanetData.ExtraResourceHints) - base + ptr_offset,
+                'datos': base64.b64encode(ctypes.string_at(ptr, count * ctypes.sizeof(elem_type))).decode('ascii'),
+            })
+        self._queue.put({'t': t, 'hook': 'on_system_load',
+                         'bytes': base64.b64encode(zlib.compress(raw, 1)).decode('ascii'),
+                         'arrays': arrays})
+
+
+class _SimulationStandIn(ctypes.Structure):
+    """Sustituto de cGcSimulation para la reproduccion: on_update solo lee mpSolarSystem"""
+    _fields_ = [("mpSolarSystem", ctypes.POINTER(nms.cGcSolarSystem))]
+
+
+class HookTraceReplayer:
+    """Reproduce una traza grabada contra un SystemDataExporter fuera del juego.
+
+    speed=1 respeta los tiempos originales; speed=0 va tan rapido como puede.
+    """
+    
+    def __init__(self, exporter, path: Path, speed: float = 1.0):
+        self.exporter = exporter
+        self.path = path
+        self.speed = speed
+        self._keep: List[Any] = []
+    
+    def _build_solar(self, event: Dict[str, Any]):
+        buf = bytearray(zlib.decompress(base64.b64decode(event['bytes'])))
+        self._keep = [buf]
+        for arr in event.get('arrays', []):
+            payload = ctypes.create_string_buffer(base64.b64decode(arr['datos']))
+            self._keep.append(payload)
+            struct.pack_into('<Q', buf, arr['offset'], ctypes.addressof(payload))
+        return ctypes.pointer(nms.cGcSolarSystem.from_buffer(buf))
+    
+    def run(self) -> Dict[str, Any]:
+        exporter = self.exporter
+        exporter.stage_stats.clear()
+        exports_before = exporter.state.total_exports
+        sim = _SimulationStandIn()
+        sim_ptr = ctypes.pointer(sim)
+        current = None
+        events = max_lag = max_queue = 0
+        
+        start = time.perf_counter()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                event = json.loads(line)
+                if event.get('tipo') == 'cabecera':
+                    if event.get('tamaño_sistema') != ctypes.sizeof(nms.cGcSolarSystem):
+                        raise ValueError("La traza se grabo con otro layout de cGcSolarSystem")
+                    continue
+                
+                if self.speed > 0:
+                    due = start + event['t'] / self.speed
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        max_lag = max(max_lag, -delay)
+                
+                if event['hook'] == 'on_system_load':
+                    current = self._build_solar(event)
+                    exporter.on_system_load(current)
+                else:
+                    if event['sistema'] and current is not None:
+                        sim.mpSolarSystem = current
+                    else:
+                        sim.mpSolarSystem = ctypes.POINTER(nms.cGcSolarSystem)()
+                    exporter.on_update(sim_ptr, 0, 0.0)
+                events += 1
+                max_queue = max(max_queue, exporter.pending_writes())
+        elapsed = time.perf_counter() - start
+        final_queue = exporter.pending_writes()
+        exporter.sinks.flush()
+        drain = time.perf_counter() - start - elapsed
+        
+        exports = exporter.state.total_exports - exports_before
+        return {
+            'eventos': events,
+            'exports': exports,
+            'duracion_s': elapsed,
+            # Sostenido: hasta que el ultimo registro esta escrito, no solo encolado
+            'exports_por_segundo': exports / (elapsed + drain) if elapsed + drain else None,
+            'retraso_max_s': max_lag,
+            'cola': {'max': max_queue, 'final': final_queue, 'vaciado_s': drain},
+            'etapas': {stage: stats.summary() for stage, stats in sorted(exporter.stage_stats.items())},
+            'sinks': exporter.sinks.metrics(),
+        }
+
+
+def config_type_ok(expected: Any, value: Any) -> bool:
+    """Comprueba un valor de exporter_config.json contra el tipo del campo de ExporterState"""
+    origin = get_origin(expected) or expected
+    if origin is int:
+        # bool es subclase de int, pero true no es un numero de exports
+        return isinstance(value, int) and not isinstance(value, bool)
+    if origin is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, origin)
+
+
 @dataclass
 class ExporterState(ModState):
     total_exports: int = 0
     auto_export_enabled: bool = False
     debug_mode: bool = False
+    export_profile: str = 'full'
+    auto_export_profile: str = 'minimal'
+    archive_layout: str = 'galaxy'
+    skip_known_systems: bool = False
+    profiler_mode: str = 'cprofile'
+    sinks: List[Dict[str, Any]] = field(default_factory=lambda: [{'type': 'json'}])
+    sink_workers: int = 2
 
 
 class SystemDataExporter(Mod):
@@ -96,18 +2296,63 @@ class SystemDataExporter(Mod):
     
     state = ExporterState()
     
-    def __init__(self):
+    def __init__(self, output_dir: Optional[Path] = None, config_dir: Optional[Path] = None):
         super().__init__()
-        self.output_dir = Path("SystemData")
+        self.output_dir = output_dir or Path("SystemData")
+        self.config_dir = config_dir or self.output_dir
         self.output_dir.mkdir(exist_ok=True)
+        # Impide compactar SystemData mientras el mod escribe en el
+        self.lock = ArchiveLock(self.output_dir)
+        if not self.lock.acquire():
+            logger.warning(f"{self.output_dir} esta en uso por otro proceso (compactacion?)")
         self.solar_system_ptr = None
+        self.stage_stats: Dict[str, RunningStats] = {}
+        self.recorder = HookTraceRecorder()
+        self.load_config()
+        self.archive = SystemArchive(self.output_dir, self.state.archive_layout)
+        # Los indices se preparan en segundo plano para no retrasar la carga
+        self.indexes = ArchiveIndexLoader(self.archive)
+        self.indexes.start()
+        # La escritura va en segundo plano: el hook solo encola
+        self.sinks = SinkDispatcher(
+            build_sinks(self.state.sinks, self.output_dir, self.archive, self.indexes),
+            self.state.sink_workers)
+        # atexit va en orden inverso: primero se vacian los sinks y luego se guardan los indices
+        atexit.register(self.lock.release)
+        atexit.register(self.indexes.close)
+        atexit.register(self.sinks.close)
         
         logger.info("=" * 60)
         logger.info("Sistema de Exportacion v3.6 - Mejoras varias")
         logger.info("CONTROLES: U=Exportar, I=Consolidar, O=Auto-export")
-        logger.info("           Y=Debug system data")
+        logger.info("           Y=Debug system data, P=Perfilador")
+        logger.info(f"Perfiles: U={self.state.export_profile}, "
+                    f"auto={self.state.auto_export_profile}")
         logger.info("=" * 60)
     
+    def load_config(self):
+        """Aplica exporter_config.json de config_dir (normalmente SystemData) sobre el estado"""
+        config = read_config(self.config_dir)
+        types = {f.name: f.type for f in fields(self.state)}
+        for key, value in config.items():
+            if key not in types:
+                logger.warning(f"{CONFIG_FILE}: clave desconocida '{key}'")
+                continue
+            if not config_type_ok(types[key], value):
+                expected = get_origin(types[key]) or types[key]
+                logger.warning(f"{CONFIG_FILE}: '{key}' debe ser de tipo {expected.__name__}")
+                continue
+            if key.endswith('_profile') and value not in EXTRACTION_PROFILES:
+                logger.warning(f"{CONFIG_FILE}: perfil desconocido '{value}' en {key}")
+                continue
+            if key == 'profiler_mode' and value not in PROFILER_MODES:
+                logger.warning(f"{CONFIG_FILE}: modo de perfilado desconocido '{value}'")
+                continue
+            if key == 'archive_layout' and value not in ARCHIVE_LAYOUTS:
+                logger.warning(f"{CONFIG_FILE}: layout desconocido '{value}'")
+                continue
+            setattr(self.state, key, value)
+    
     def clean_bytes(self, value) -> Optional[str]:
         """Limpia bytes a string"""
         if value is None:
@@ -330,9 +2575,12 @@ class SystemDataExporter(Mod):
     # =========================================================================
     
     @nms.cGcSimulation.Update.after
+    @profiled
     def on_update(self, this: ctypes._Pointer[nms.cGcSimulation], 
                   leMode: ctypes.c_uint32, lfTimeStep: float):
         try:
+            if self.recorder.active:
+                self.recorder.record_update(this)
             sim = this.contents
             if hasattr(sim, 'mpSolarSystem') and sim.mpSolarSystem:
                 if self.solar_system_ptr is None:
@@ -342,16 +2590,31 @@ class SystemDataExporter(Mod):
             pass
     
     @nms.cGcSolarSystem.Construct.after
+    @profiled
+    @timed_stage('hook_construct')
     def on_system_load(self, this: ctypes._Pointer[nms.cGcSolarSystem]):
         try:
+            if self.recorder.active:
+                self.recorder.record_system_load(this)
             self.solar_system_ptr = this
             logger.info("Nuevo sistema cargado!")
             if self.state.auto_export_enabled:
-                data = self.get_system_data()
+                if self.state.skip_known_systems and self._is_known_system():
+                    logger.info("Sistema ya exportado, se omite")
+                    return
+                data = self.get_system_data(self.state.auto_export_profile)
                 self.save_data(data)
         except Exception as e:
             logger.error(f"Error: {e}")
     
+    def _is_known_system(self) -> bool:
+        """Consulta el indice de seeds; si no esta listo se exporta igualmente"""
+        try:
+            seed = self.solar_system_ptr.contents.mSolarSystemData.Seed.Seed
+        except Exception:
+            return False
+        return self.indexes.known_seed(seed) is True
+    
     # =========================================================================
     # GUI
     # =========================================================================
@@ -365,110 +2628,149 @@ class SystemDataExporter(Mod):
     def auto_export(self, value):
         self.state.auto_export_enabled = value
     
+    @property
+    @BOOLEAN("Grabar traza:")
+    def trace_recording(self):
+        return self.recorder.active
+    
+    @trace_recording.setter
+    def trace_recording(self, value):
+        if value and not self.recorder.active:
+            path = self.recorder.start(self.output_dir / TRACES_DIR)
+            logger.info(f"Grabando traza en {path.name}")
+        elif not value and self.recorder.active:
+            self.recorder.stop()
+            logger.info(f"Traza guardada: {self.recorder.path.name}")
+            if self.recorder.errors:
+                logger.warning(f"{self.recorder.errors} eventos no se pudieron grabar")
+    
     @property
     @STRING("Exports:", decimal=True)
     def exports(self):
         return str(self.state.total_exports)
     
+    @property
+    @STRING("Sinks:")
+    def sinks_status(self):
+        parts = []
+        for name, m in self.sinks.metrics().items():
+            p50 = m['latencia_s']['p50']
+            text = f"{name} {p50 * 1000:.0f}ms" if p50 is not None else name
+            if m['errores']:
+                text += f" ({m['errores']} err)"
+            parts.append(text)
+        return " | ".join(parts) or "ninguno"
+    
+    @property
+    @STRING("Agregados:")
+    def aggregates_headline(self):
+        if not self.indexes.ready.is_set():
+            return "cargando..."
+        return self.indexes.aggregates.headline()
+    
+    @property
+    @STRING("Perfilador:")
+    def profiler_status(self):
+        if PROFILER.active:
+            return f"ON ({PROFILER.mode})"
+        return PROFILER.last_summary or "OFF"
+    
+    @property
+    @STRING("Perfil (U):")
+    def export_profile(self):
+        return self.state.export_profile
+    
+    @export_profile.setter
+    def export_profile(self, value):
+        self._set_profile('export_profile', value)
+    
+    @property
+    @STRING("Perfil auto-export:")
+    def auto_export_profile(self):
+        return self.state.auto_export_profile
+    
+    @auto_export_profile.setter
+    def auto_export_profile(self, value):
+        self._set_profile('auto_export_profile', value)
+    
+    def _set_profile(self, attr: str, value: str):
+        value = (value or '').strip().lower()
+        if value not in EXTRACTION_PROFILES:
+            logger.warning(f"Perfil desconocido: '{value}' "
+                           f"(disponibles: {', '.join(EXTRACTION_PROFILES)})")
+            return
+        setattr(self.state, attr, value)
+    
     # =========================================================================
     # DEBUG
     # =========================================================================
     
-    def log_system_structure(self):
-        """Loguea la estructura completa de mSolarSystemData"""
+    def dump_system_structure(self) -> Optional[Path]:
+        """Vuelca mSolarSystemData a un JSON estructurado desde una sola lectura de memoria"""
         if not self.solar_system_ptr:
             logger.warning("No hay sistema cargado")
-            return
+            return None
         
         try:
-            solar = self.solar_system_ptr.contents
+            ss = self.solar_system_ptr.contents.mSolarSystemData
+            ctype = type(ss)
+            raw = ctypes.string_at(ctypes.addressof(ss), ctypes.sizeof(ctype))
             
-            if hasattr(solar, 'mSolarSystemData'):
-                ss = solar.mSolarSystemData
-                logger.info("=" * 80)
-                logger.info("ESTRUCTURA DE mSolarSystemData:")
-                logger.info("=" * 80)
-                
-                attrs = [a for a in dir(ss) if not a.startswith('_')]
-                logger.info(f"Atributos disponibles ({len(attrs)}):")
-                for attr in sorted(attrs):
-                    try:
-                        value = getattr(ss, attr)
-                        type_name = type(value).__name__
-                        
-                        if hasattr(value, 'name'):
-                            display = f"{value.name} (enum)"
-                        elif hasattr(value, 'value'):
-                            display = f"{value.value}"
-                        elif isinstance(value, (int, float, bool)):
-                            display = str(value)
-                        elif isinstance(value, bytes):
-                            try:
-                                decoded = value.decode('utf-8', errors='ignore').strip('\x00')
-                                display = f'"{decoded}"' if decoded else "(vacío)"
-                            except:
-                                display = f"<bytes: {len(value)}>"
-                        elif isinstance(value, str):
-                            display = f'"{value}"' if value else "(vacío)"
-                        else:
-                            display = f"<{type_name}>"
-                        
-                        logger.info(f"  {attr:30s} = {display}")
-                    except Exception as e:
-                        logger.info(f"  {attr:30s} = ERROR: {e}")
-                
-                logger.info("=" * 80)
-                
-                # TradingData detallado
-                if hasattr(ss, 'TradingData'):
-                    logger.info("\nTRADINGDATA DETALLADO:")
-                    td = ss.TradingData
-                    td_attrs = [a for a in dir(td) if not a.startswith('_')]
-                    for attr in sorted(td_attrs):
-                        try:
-                            value = getattr(td, attr)
-                            if hasattr(value, 'name'):
-                                logger.info(f"  {attr:35s} = {value.name}")
-                            elif isinstance(value, (int, float)):
-                                logger.info(f"  {attr:35s} = {value}")
-                            elif isinstance(value, bool):
-                                logger.info(f"  {attr:35s} = {value}")
-                            else:
-                                logger.info(f"  {attr:35s} = {type(value).__name__}")
-                        except Exception as e:
-                            logger.info(f"  {attr:35s} = ERROR: {e}")
-                    logger.info("=" * 80)
-                
-                # SpaceStationSpawn detallado
-                if hasattr(ss, 'SpaceStationSpawn'):
-                    logger.info("\nSPACESTATIONSPAWN DETALLADO:")
-                    sss = ss.SpaceStationSpawn
-                    sss_attrs = [a for a in dir(sss) if not a.startswith('_')]
-                    for attr in sorted(sss_attrs):
-                        try:
-                            value = getattr(sss, attr)
-                            if hasattr(value, 'name'):
-                                logger.info(f"  {attr:35s} = {value.name}")
-                            elif isinstance(value, bytes):
-                                decoded = value.decode('utf-8', errors='ignore').strip('\x00')
-                                logger.info(f"  {attr:35s} = {decoded}")
-                            else:
-                                logger.info(f"  {attr:35s} = {value}")
-                        except Exception as e:
-                            logger.info(f"  {attr:35s} = ERROR: {e}")
-                    logger.info("=" * 80)
-                
+            schemas = collect_schemas(ctype)
+            dump = {
+                'timestamp': datetime.now().isoformat(),
+                'nmspy': nmspy_version(),
+                'tipo': ctype.__name__,
+                'tamaño': len(raw),
+                'valores': decode_raw(ctype, raw),
+                'esquemas': schemas,
+                'cambios_esquema': self._check_schema(schemas),
+            }
+            
+            debug_dir = self.output_dir / DEBUG_DIR
+            debug_dir.mkdir(exist_ok=True)
+            path = debug_dir / f"estructura_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json"
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(dump, f, indent=2, ensure_ascii=False, default=str)
+            logger.info(f"Estructura volcada en {path.name} ({len(raw)} bytes)")
+            return path
         except Exception as e:
-            logger.error(f"Error en log_system_structure: {e}")
+            logger.error(f"Error en dump_system_structure: {e}")
+            return None
+    
+    def _check_schema(self, schemas: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Compara los esquemas con la referencia guardada y la actualiza si cambian"""
+        baseline_path = self.output_dir / DEBUG_DIR / SCHEMA_BASELINE_FILE
+        baseline_path.parent.mkdir(exist_ok=True)
+        current = {'nmspy': nmspy_version(), 'esquemas': schemas}
+        
+        try:
+            with open(baseline_path, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError):
+            baseline = None
+        
+        report = diff_schemas(baseline['esquemas'], schemas) if baseline else {}
+        if report:
+            logger.warning(f"Layout cambiado desde nmspy {baseline.get('nmspy')}: "
+                           f"{', '.join(report)}")
+        if report or baseline is None:
+            with open(baseline_path, 'w', encoding='utf-8') as f:
+                json.dump(current, f, indent=2, ensure_ascii=False)
+        return report
     
     # =========================================================================
     # EXTRACCION
     # =========================================================================
     
-    def get_system_data(self) -> Dict[str, Any]:
+    @timed_stage('extraccion')
+    def get_system_data(self, profile: str = 'full') -> Dict[str, Any]:
+        plan = compile_profile(profile)
+        fields = plan.system_fields
         data = {
             'timestamp': datetime.now().isoformat(),
             'version': '3.6',
+            'perfil': plan.name,
             'sistema': {},
             'planetas': [],
         }
@@ -484,13 +2786,13 @@ class SystemDataExporter(Mod):
                 ss = solar.mSolarSystemData
                 
                 # Nombre
-                if hasattr(ss, 'Name'):
+                if 'Name' in fields and hasattr(ss, 'Name'):
                     name = self.clean_bytes(ss.Name)
                     if name:
                         data['sistema']['nombre'] = name
                 
                 # Raza
-                if hasattr(ss, 'InhabitingRace'):
+                if 'InhabitingRace' in fields and hasattr(ss, 'InhabitingRace'):
                     race = self.safe_enum_extract(
                         ss.InhabitingRace,
                         enums.cGcAlienRace,
@@ -500,7 +2802,7 @@ class SystemDataExporter(Mod):
                         data['sistema']['raza'] = race
                 
                 # Clase (con safe_enum_extract)
-                if hasattr(ss, 'Class'):
+                if 'Class' in fields and hasattr(ss, 'Class'):
                     class_val = self.safe_enum_extract(
                         ss.Class,
                         enums.cGcSolarSystemClass,
@@ -510,7 +2812,7 @@ class SystemDataExporter(Mod):
                         data['sistema']['clase'] = class_val
                 
                 # StarType (con safe_enum_extract)
-                if hasattr(ss, 'StarType'):
+                if 'StarType' in fields and hasattr(ss, 'StarType'):
                     star_type = self.safe_enum_extract(
                         ss.StarType,
                         enums.cGcGalaxyStarTypes,
@@ -520,7 +2822,7 @@ class SystemDataExporter(Mod):
                         data['sistema']['tipo_estrella'] = star_type
                 
                 # Seed
-                if hasattr(ss, 'Seed'):
+                if 'Seed' in fields and hasattr(ss, 'Seed'):
                     try:
                         seed_obj = ss.Seed
                         if hasattr(seed_obj, 'Seed'):
@@ -531,21 +2833,13 @@ class SystemDataExporter(Mod):
                         pass
                 
                 # SpaceStationSpawn - extraer correctamente
-                if hasattr(ss, 'SpaceStationSpawn'):
+                if 'SpaceStationSpawn' in fields and hasattr(ss, 'SpaceStationSpawn'):
                     station_data = self.extract_space_station_spawn(ss.SpaceStationSpawn)
                     if station_data:
                         data['sistema']['estacion_espacial'] = station_data
                 
                 # Otros campos seguros
-                safe_fields = {
-                    'AnomalyStation': 'estacion_anomalia',
-                    'PirateStation': 'estacion_pirata',
-                    'Abandoned': 'abandonado',
-                    'Planets': 'num_planetas_campo',
-                    'PrimePlanets': 'planetas_primarios',
-                }
-                
-                for field, spanish_name in safe_fields.items():
+                for field, spanish_name in plan.safe_fields:
                     if hasattr(ss, field):
                         try:
                             value = self.extract_value(getattr(ss, field))
@@ -555,13 +2849,13 @@ class SystemDataExporter(Mod):
                             pass
                 
                 # TradingData - extraer correctamente
-                if hasattr(ss, 'TradingData'):
+                if 'TradingData' in fields and hasattr(ss, 'TradingData'):
                     trading_data = self.extract_trading_data(ss.TradingData)
                     if trading_data:
                         data['sistema']['comercio'] = trading_data
                 
                 # ConflictData
-                if hasattr(ss, 'ConflictData'):
+                if 'ConflictData' in fields and hasattr(ss, 'ConflictData'):
                     conflict = self.safe_enum_extract(
                         ss.ConflictData,
                         enums.cGcPlayerConflictData,
@@ -571,7 +2865,7 @@ class SystemDataExporter(Mod):
                         data['sistema']['conflicto'] = conflict
                 
                 # AsteroidLevel - Intentar extraer sin especificar el enum anidado
-                if hasattr(ss, 'AsteroidLevel'):
+                if 'AsteroidLevel' in fields and hasattr(ss, 'AsteroidLevel'):
                     try:
                         # Intentar obtener el nombre directamente si es un enum
                         if hasattr(ss.AsteroidLevel, 'name'):
@@ -595,14 +2889,19 @@ class SystemDataExporter(Mod):
             
             # Planetas - VALIDACIÓN ESTRICTA
             if hasattr(solar, 'maPlanets'):
-                planets = solar.maPlanets
                 valid_count = 0
                 
-                for i, planet in enumerate(planets):
-                    if not self._is_valid_planet(planet):
+                for i, planet in self._planet_slots(solar.maPlanets, plan.include_invalid):
+                    score = self._planet_score(planet)
+                    if score < 6:
+                        if plan.include_invalid:
+                            data.setdefault('planetas_descartados', []).append(
+                                {'slot': i, 'puntuacion': score})
                         continue
                     
-                    planet_data = self.extract_planet(planet, valid_count)
+                    planet_data = self.extract_planet(planet, valid_count, plan)
+                    if plan.include_invalid:
+                        planet_data['puntuacion'] = score
                     data['planetas'].append(planet_data)
                     valid_count += 1
                 
@@ -614,8 +2913,32 @@ class SystemDataExporter(Mod):
         
         return data
     
-    def _is_valid_planet(self, planet) -> bool:
-        """Verifica si un planeta tiene datos válidos con VALIDACIÓN ESTRICTA"""
+    def _planet_slots(self, planets, keep_empty: bool = False) -> Iterator[Tuple[int, Any]]:
+        """Slots de maPlanets leidos de una sola copia del array.
+
+        Los slots sin nombre y con seed 0/-1 no pueden llegar a la
+        puntuacion minima, asi que se descartan mirando solo esos bytes.
+        """
+        layout = None
+        if isinstance(planets, ctypes.Array) and issubclass(planets._type_, ctypes.Structure):
+            layout = planet_slot_layout(planets._type_)
+        if layout is None:
+            yield from enumerate(planets)
+            return
+        
+        raw = ctypes.string_at(ctypes.addressof(planets), ctypes.sizeof(planets))
+        copy = type(planets).from_buffer_copy(raw)
+        stride = ctypes.sizeof(planets._type_)
+        seed_off, name_off = layout
+        for i in range(len(copy)):
+            base = i * stride
+            seed = raw[base + seed_off:base + seed_off + 8]
+            if not keep_empty and raw[base + name_off] == 0 and seed in (b'\x00' * 8, b'\xff' * 8):
+                continue
+            yield i, copy[i]
+    
+    def _planet_score(self, planet) -> int:
+        """Puntuacion de validez de un planeta (>= 6 es valido)"""
         try:
             score = 0
             
@@ -672,18 +2995,21 @@ class SystemDataExporter(Mod):
                     if res and len(res) > 0:
                         score += 1
             
-            return score >= 6
+            return score
             
         except Exception as e:
             logger.error(f"Error validando planeta: {e}")
-            return False
+            return 0
     
-    def extract_planet(self, planet, index: int) -> Dict[str, Any]:
+    def extract_planet(self, planet, index: int,
+                       plan: Optional[ExtractionPlan] = None) -> Dict[str, Any]:
+        plan = plan or compile_profile('full')
+        fields = plan.planet_fields
         info = {'index': index}
 
         try:
             # Posición
-            if hasattr(planet, 'mPosition'):
+            if 'mPosition' in fields and hasattr(planet, 'mPosition'):
                 pos = planet.mPosition
                 info['posicion'] = {
                     'x': float(getattr(pos, 'x', 0)),
@@ -696,19 +3022,19 @@ class SystemDataExporter(Mod):
                 pd = planet.mPlanetData
 
                 # Nombre
-                if hasattr(pd, 'Name'):
+                if 'Name' in fields and hasattr(pd, 'Name'):
                     name = self.clean_bytes(pd.Name)
                     if name:
                         info['nombre'] = name
 
                 # Vida
-                if hasattr(pd, 'Life'):
+                if 'Life' in fields and hasattr(pd, 'Life'):
                     life = self.extract_value(pd.Life)
                     if life:
                         info['vida'] = life
 
                 # Fauna
-                if hasattr(pd, 'CreatureLife'):
+                if 'CreatureLife' in fields and hasattr(pd, 'CreatureLife'):
                     cl = self.extract_value(pd.CreatureLife)
                     if cl:
                         info['fauna'] = cl
@@ -716,7 +3042,8 @@ class SystemDataExporter(Mod):
                 # Recursos básicos con traducción
                 recursos_basicos = []
                 recursos_basicos_trad = []
-                for field in ('CommonSubstanceID', 'UncommonSubstanceID', 'RareSubstanceID'):
+                substance_fields = ('CommonSubstanceID', 'UncommonSubstanceID', 'RareSubstanceID')
+                for field in (substance_fields if 'Substances' in fields else ()):
                     if hasattr(pd, field):
                         res = self.clean_bytes(getattr(pd, field))
                         if res and res not in recursos_basicos:
@@ -730,16 +3057,12 @@ class SystemDataExporter(Mod):
                 # Recursos extra
                 recursos_extra = []
                 recursos_extra_trad = []
-                if hasattr(pd, 'ExtraResourceHints'):
+                if 'ExtraResourceHints' in fields and hasattr(pd, 'ExtraResourceHints'):
                     try:
-                        for hint in pd.ExtraResourceHints:
-                            if not hint:
-                                continue
-                            if hasattr(hint, 'Resource'):
-                                res = self.clean_bytes(hint.Resource)
-                                if res and res not in recursos_extra:
-                                    recursos_extra.append(res)
-                                    recursos_extra_trad.append(self.translate_resource(res))
+                        for res in self._extra_resource_ids(pd.ExtraResourceHints):
+                            if res not in recursos_extra:
+                                recursos_extra.append(res)
+                                recursos_extra_trad.append(self.translate_resource(res))
                     except:
                         pass
 
@@ -748,31 +3071,11 @@ class SystemDataExporter(Mod):
                     info['recursos_extra_es'] = recursos_extra_trad
 
             # GenerationInputData
-            if hasattr(planet, 'mPlanetGenerationInputData'):
+            if (plan.gen_fields or plan.gen_seed) and hasattr(planet, 'mPlanetGenerationInputData'):
                 gen = planet.mPlanetGenerationInputData
                 gen_data = {}
 
-                # Lista de campos a extraer
-                gen_fields = {
-                    'Biome': 'bioma',
-                    'BiomeSubType': 'bioma_subtipo',
-                    'Class': 'clase',
-                    'CommonSubstance': 'sustancia_comun',
-                    'RareSubstance': 'sustancia_rara',
-                    'ForceContinents': 'forzar_continentes',
-                    'HasRings': 'tiene_anillos',
-                    'InAbandonedSystem': 'sistema_abandonado',
-                    'InEmptySystem': 'sistema_vacio',
-                    'InGasGiantSystem': 'sistema_gigante_gaseoso',
-                    'InPirateSystem': 'sistema_pirata',
-                    'PlanetIndex': 'indice_planeta',
-                    'PlanetSize': 'tamaño_planeta',
-                    'Prime': 'planeta_primario',
-                    'RealityIndex': 'indice_realidad',
-                    'Star': 'estrella',
-                }
-
-                for field, spanish_name in gen_fields.items():
+                for field, spanish_name in plan.gen_fields:
                     if hasattr(gen, field):
                         try:
                             value = self.extract_value(getattr(gen, field))
@@ -786,7 +3089,7 @@ class SystemDataExporter(Mod):
                             pass
 
                 # Seed
-                if hasattr(gen, 'Seed'):
+                if plan.gen_seed and hasattr(gen, 'Seed'):
                     try:
                         seed_obj = gen.Seed
                         if hasattr(seed_obj, 'Seed'):
@@ -800,7 +3103,7 @@ class SystemDataExporter(Mod):
                     info['generacion'] = gen_data
 
             # Discovery
-            if hasattr(planet, 'mPlanetDiscoveryData'):
+            if 'mUniverseAddress' in fields and hasattr(planet, 'mPlanetDiscoveryData'):
                 disc = planet.mPlanetDiscoveryData
                 if hasattr(disc, 'mUniverseAddress'):
                     info['direccion_universo'] = str(disc.mUniverseAddress)
@@ -811,54 +3114,55 @@ class SystemDataExporter(Mod):
 
         return info
     
+    def _extra_resource_ids(self, hints) -> List[str]:
+        """IDs de recurso de ExtraResourceHints con una sola copia del buffer"""
+        bulk = read_dynamic_array(hints)
+        if bulk is not None and hasattr(bulk[2], 'Resource'):
+            raw, count, elem_type = bulk
+            field = elem_type.Resource
+            return decode_fixed_strings(raw, ctypes.sizeof(elem_type), field.offset, field.size, count)
+        
+        # Layout desconocido: elemento a elemento
+        ids = []
+        for hint in hints:
+            if hint and hasattr(hint, 'Resource'):
+                res = self.clean_bytes(hint.Resource)
+                if res:
+                    ids.append(res)
+        return ids
+    
+    @timed_stage('guardado')
     def save_data(self, data: Dict[str, Any]) -> bool:
+        """Encola el registro para todos los sinks; la escritura es asincrona"""
         try:
-            ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-            name = data.get('sistema', {}).get('nombre', '')
-            if name:
-                safe = "".join(c for c in name if c.isalnum() or c in "- _")[:20]
-                filename = f"system_{safe}_{ts}.json"
-            else:
-                filename = f"system_{ts}.json"
-            
-            path = self.output_dir / filename
-            with open(path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False, default=str)
-            
-            logger.info(f"Guardado: {filename}")
-            
-            latest = self.output_dir / "latest_system.json"
-            with open(latest, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False, default=str)
-            
+            # El ID se asigna antes del reparto para que todos los sinks lo compartan
+            if not data.get('id'):
+                data['id'] = SystemArchive.new_record_id(data)
+            self.sinks.submit(data)
             self.state.total_exports += 1
             return True
         except Exception as e:
             logger.error(f"Error guardando: {e}")
             return False
     
+    def pending_writes(self) -> int:
+        """Escrituras pendientes sumando todos los sinks"""
+        return self.sinks.pending()
+    
     def export_all(self) -> Optional[str]:
         try:
-            systems = []
-            for f in sorted(self.output_dir.glob("system_*.json")):
-                try:
-                    with open(f, 'r', encoding='utf-8') as fp:
-                        systems.append(json.load(fp))
-                except:
-                    pass
-            
-            if not systems:
-                return None
-            
-            path = self.output_dir / "all_systems.json"
-            with open(path, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'fecha': datetime.now().isoformat(),
-                    'total': len(systems),
-                    'sistemas': systems
-                }, f, indent=2, ensure_ascii=False, default=str)
-            return str(path)
-        except:
+            if not self.sinks.flush(timeout=10):
+                logger.warning("Quedan escrituras pendientes; el consolidado puede no incluirlas")
+            legacy = self.archive.legacy_files()
+            if legacy:
+                logger.info(f"{len(legacy)} exports en formato plano; "
+                            f"ejecuta 'python systemexporter.py migrar' para moverlos")
+            summary = consolidate(self.archive.all_files(), self.output_dir / CONSOLIDATED_FILE,
+                                  workers=INGAME_CONSOLIDATE_WORKERS)
+            log_consolidation(summary)
+            return summary['ruta']
+        except Exception as e:
+            logger.error(f"Error consolidando: {e}")
             return None
     
     # =========================================================================
@@ -866,18 +3170,20 @@ class SystemDataExporter(Mod):
     # =========================================================================
     
     @on_key_release("u")
+    @profiled
     def export_current(self):
         logger.info("=" * 50)
         if not self.solar_system_ptr:
             logger.warning("Sin sistema!")
             return
         
-        data = self.get_system_data()
+        data = self.get_system_data(self.state.export_profile)
         if self.save_data(data):
             logger.info(f"OK! Planetas: {len(data.get('planetas', []))}")
         logger.info("=" * 50)
     
     @on_key_release("i")
+    @profiled
     def export_consolidated(self):
         logger.info("=" * 50)
         path = self.export_all()
@@ -890,15 +3196,124 @@ class SystemDataExporter(Mod):
         logger.info(f"Auto-export: {'ON' if self.auto_export else 'OFF'}")
     
     @on_key_release("y")
+    @profiled
     def debug_system(self):
-        """Debug: muestra estructura completa del sistema"""
-        self.log_system_structure()
+        """Debug: vuelca la estructura completa del sistema a SystemData/debug/"""
+        self.dump_system_structure()
+    
+    @on_key_release("p")
+    def toggle_profiler(self):
+        """Inicia o detiene el perfilado del codigo del mod"""
+        if not PROFILER.active:
+            PROFILER.start(self.state.profiler_mode)
+            logger.info(f"Perfilador ON ({self.state.profiler_mode})")
+            return
+        try:
+            for line in PROFILER.stop(self.output_dir / PROFILES_DIR):
+                logger.info(line)
+        except Exception as e:
+            logger.error(f"Error guardando el perfil: {e}")
 
 
 def main():
     return SystemDataExporter()
 
 
+def cli(argv: List[str]) -> int:
+    """Herramientas de mantenimiento del archivo, fuera del juego"""
+    parser = argparse.ArgumentParser(prog="systemexporter.py",
+                                     description="Mantenimiento de SystemData")
+    parser.add_argument('--dir', default="SystemData", help="Carpeta del archivo")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    
+    migrar = sub.add_parser('migrar', help="Mueve los system_*.json planos al layout sharded")
+    migrar.add_argument('--layout', choices=ARCHIVE_LAYOUTS, default=None,
+                        help="Por defecto el archive_layout de exporter_config.json")
+    
+    consolidar = sub.add_parser('consolidar', help=f"Genera {CONSOLIDATED_FILE} en paralelo")
+    consolidar.add_argument('--workers', type=int, default=None)
+    consolidar.add_argument('--hilos', action='store_true', help="Usar hilos en vez de procesos")
+    
+    compactar = sub.add_parser('compactar', help="Fusiona duplicados, reescribe el archivo y limpia")
+    compactar.add_argument('--historial', action='store_true',
+                           help="Conservar las versiones antiguas dentro de cada registro")
+    compactar.add_argument('--layout', choices=ARCHIVE_LAYOUTS, default=None,
+                           help="Por defecto el archive_layout de exporter_config.json")
+    compactar.add_argument('--workers', type=int, default=None)
+    compactar.add_argument('--hilos', action='store_true', help="Usar hilos en vez de procesos")
+    
+    replay = sub.add_parser('replay', help="Reproduce una traza de hooks y mide el rendimiento")
+    replay.add_argument('traza', type=Path)
+    replay.add_argument('--velocidad', type=float, default=1.0, help="1 = tiempo real, 0 = sin esperas")
+    replay.add_argument('--perfil', choices=list(EXTRACTION_PROFILES), default=None,
+                        help="Perfil de auto-export (por defecto el de exporter_config.json en --dir)")
+    
+    agregados = sub.add_parser('agregados', help="Muestra las vistas agregadas de economia y biomas")
+    agregados.add_argument('vista', nargs='?', default='comercio', choices=('comercio', *FREQUENCY_VIEWS))
+    agregados.add_argument('--top', type=int, default=10)
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    root = Path(args.dir)
+    
+    if args.comando == 'replay':
+        # Se usa la configuracion de --dir, pero los exports van a una carpeta propia
+        exporter = SystemDataExporter(root.with_name(root.name + "_replay"), config_dir=root)
+        exporter.state.auto_export_enabled = True
+        if args.perfil:
+            exporter.state.auto_export_profile = args.perfil
+        logging.getLogger("SystemExporter").setLevel(logging.WARNING)
+        report = HookTraceReplayer(exporter, args.traza, args.velocidad).run()
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return 0
+    
+    if not root.is_dir():
+        parser.error(f"No existe la carpeta {root}")
+    
+    if getattr(args, 'layout', 'galaxy') is None:
+        args.layout = read_config(root).get('archive_layout', 'galaxy')
+        if args.layout not in ARCHIVE_LAYOUTS:
+            parser.error(f"{CONFIG_FILE}: layout desconocido '{args.layout}'")
+    
+    if args.comando == 'migrar':
+        moved, failed = SystemArchive(root, args.layout).migrate_flat()
+        print(f"Migrados: {moved}, errores: {failed}")
+        return 1 if failed else 0
+    
+    if args.comando == 'consolidar':
+        summary = consolidate(SystemArchive(root).all_files(), root / CONSOLIDATED_FILE,
+                              workers=args.workers, processes=not args.hilos)
+        log_consolidation(summary)
+        print(f"Consolidado: {summary['ruta']}" if summary['ruta'] else "Sin datos")
+        return 1 if summary['errores'] else 0
+    
+    if args.comando == 'compactar':
+        try:
+            summary = ArchiveCompactor(root, args.layout, args.historial, args.workers,
+                                       processes=not args.hilos).run()
+        except RuntimeError as e:
+            print(e)
+            return 1
+        errors = summary.pop('errores', [])
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+        if errors:
+            print(f"{len(errors)} ficheros ilegibles movidos a {root / CORRUPT_DIR}")
+        return 0
+    
+    if args.comando == 'agregados':
+        # Solo se leen los registros anadidos al manifiesto desde que se guardaron los indices
+        indexes = ArchiveIndexLoader(SystemArchive(root))
+        indexes.warm_up()
+        try:
+            print(json.dumps(indexes.aggregate(args.vista, args.top), indent=2, ensure_ascii=False))
+        finally:
+            indexes.close()
+        return 1 if indexes.failed else 0
+    return 0
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(cli(sys.argv[1:]))
     from pymhf import load_mod_file
     load_mod_file(__file__)
\ No newline at end of file
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+pytest.importorskip("pymhf")
+pytest.importorskip("nmspy")
+
+import systemexporter as se
+
+
+def make_archive(root, count=5):
+    archive = se.SystemArchive(root)
+    for i in range(count):
+        archive.write({
+            'timestamp': f"2024-01-01T00:00:0{i}",
+            'perfil': 'full',
+            'sistema': {'nombre': f"Sistema {i}", 'seed': 100 + i},
+            'planetas': [],
+        })
+    return archive
+
+
+def archived_seeds(root):
+    seeds = []
+    for path in se.SystemArchive(root).record_paths():
+        with open(path, 'r', encoding='utf-8') as f:
+            seeds.append(json.load(f)['sistema']['seed'])
+    return sorted(seeds)
+
+
+def test_resume_after_partial_scan_line(tmp_path):
+    archive = make_archive(tmp_path)
+    compactor = se.ArchiveCompactor(tmp_path, processes=False, workers=1)
+    compactor.work_dir.mkdir()
+    compactor._save_journal('escaneo')
+
+    # Escaneo interrumpido a mitad de la tercera linea
+    lines = [json.dumps(se._scan_record(str(p)), ensure_ascii=False) + '\n'
+             for p in list(archive.record_paths())[:3]]
+    with open(compactor.scan_log, 'w', encoding='utf-8') as f:
+        f.write(lines[0] + lines[1] + lines[2][:len(lines[2]) // 2])
+
+    summary = se.ArchiveCompactor(tmp_path, processes=False, workers=1).run()
+
+    assert archived_seeds(tmp_path) == [100, 101, 102, 103, 104]
+    assert summary['sistemas'] == 5
+    assert summary['errores'] == []
+
+
+def test_open_log_truncates_partial_line(tmp_path):
+    log = tmp_path / "escaneo.ndjson"
+    log.write_text('{"a": 1}\n{"b": ', encoding='utf-8')
+
+    with se.ArchiveCompactor._open_log(log) as f:
+        f.write('{"c": 3}\n')
+
+    assert se.ArchiveCompactor._read_log(log) == [{'a': 1}, {'c': 3}]